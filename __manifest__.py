@@ -30,13 +30,22 @@
         'security/ir.model.access.csv',
         'data/sequence_data.xml',
         'data/cron_data.xml',
+        'data/product_removal_data.xml',
         'views/mrp_production_views.xml',
         'views/mrp_bom_views.xml',
+        'views/mrp_bom_waste_analysis_views.xml',
+        'views/mrp_bom_waste_rule_views.xml',
         'views/mrp_production_batch_wizard_views.xml',
         'views/mrp_production_purchase_wizard_views.xml',
         'views/product_lot_quality_views.xml',
         'views/stock_picking_quality_views.xml',
+        'views/stock_picking_quality_sampling_views.xml',
+        'views/stock_picking_quality_report_views.xml',
+        'views/res_config_settings_views.xml',
+        'report/mrp_report_bom_structure.xml',
         'wizard/stock_picking_quality_wizard_views.xml',
+        'wizard/mrp_bom_waste_update_wizard_views.xml',
+        'wizard/product_lot_quality_import_wizard_views.xml',
     ],
     'assets': {
         'web.assets_backend': [
@@ -1,6 +1,15 @@
 from . import mrp_production
+from . import mrp_production_recompute
 from . import mrp_bom
+from . import mrp_bom_waste_analysis
+from . import mrp_bom_waste_rule
 from . import mrp_production_batch
 from . import mrp_production_purchase_wizard
 from . import product_lot_quality
-from . import stock_picking_quality
\ No newline at end of file
+from . import stock_picking_quality
+from . import stock_picking_quality_sampling
+from . import stock_picking_quality_report
+from . import stock_picking
+from . import stock_move_line
+from . import stock_quant
+from . import res_company
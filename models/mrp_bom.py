@@ -10,13 +10,136 @@ class MrpBom(models.Model):
         help="Porcentaje de merma que se aplicará a todos los componentes de esta BOM. "
              "Ejemplo: 5.0 para 5% de merma adicional"
     )
+
+    effective_waste_factor = fields.Float(
+        string='Factor de Merma Efectivo',
+        compute='_compute_effective_waste_factor',
+        store=True,
+        digits=(16, 6),
+        help="Mayor factor de merma de los componentes de esta BOM, acumulando la merma "
+             "de los kits intermedios. Ejemplo: 1.155 si una línea tiene 5% de merma y el "
+             "componente de su kit un 10%. Las sub-BOMs que no son kits no se acumulan"
+    )
     
+    @api.depends('bom_line_ids.product_id', 'bom_line_ids.product_qty', 'bom_line_ids.total_qty_with_waste')
+    def _compute_effective_waste_factor(self):
+        """
+        Calcula el factor de merma a partir de los factores de las líneas. Leer el
+        factor de un kit pendiente de cálculo fuerza su cálculo antes que el de la
+        BOM padre.
+        """
+        for bom in self:
+            waste_factors = bom.bom_line_ids._get_waste_factors()
+            line_factors = []
+            for line in bom.bom_line_ids:
+                child_bom = line.child_bom_id
+                child_factor = 1.0
+                if child_bom and child_bom.type == 'phantom' and child_bom != bom:
+                    child_factor = child_bom.effective_waste_factor
+                line_factors.append(waste_factors[line.id] * child_factor)
+            bom.effective_waste_factor = max(line_factors, default=1.0)
+
+    def _get_parent_boms(self):
+        """Devuelve las BOMs que usan como componente los productos de estas BOMs"""
+        if not self:
+            return self.browse()
+        parent_lines = self.env['mrp.bom.line'].search([
+            ('product_tmpl_id', 'in', self.product_tmpl_id.ids)
+        ])
+        return parent_lines.bom_id - self
+
+    def _invalidate_effective_waste_factor(self):
+        """Marca para recalcular el factor efectivo de todas las BOMs que dependen de estas"""
+        field = self._fields['effective_waste_factor']
+        visited = self
+        boms = self
+        while boms:
+            boms = boms._get_parent_boms() - visited
+            if boms:
+                self.env.add_to_compute(field, boms)
+            visited |= boms
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Recalcula el factor efectivo de las BOMs que usan el producto de las nuevas BOMs"""
+        boms = super().create(vals_list)
+        boms._invalidate_effective_waste_factor()
+        return boms
+
+    def write(self, vals):
+        """Propaga los cambios de merma o de estructura a las BOMs padre"""
+        tracked_fields = {'waste_percentage', 'bom_line_ids', 'product_tmpl_id', 'product_id', 'active', 'type'}
+        if not tracked_fields.intersection(vals):
+            return super().write(vals)
+        if 'product_tmpl_id' in vals or 'product_id' in vals:
+            self._invalidate_effective_waste_factor()
+        result = super().write(vals)
+        self._invalidate_effective_waste_factor()
+        return result
+
+    def unlink(self):
+        """Recalcula el factor efectivo de las BOMs padre de las BOMs eliminadas"""
+        self._invalidate_effective_waste_factor()
+        return super().unlink()
+
+    def _get_compounded_waste_factors(self):
+        """
+        Devuelve un diccionario {id de línea: factor de merma} para los componentes
+        de la BOM, acumulando la merma de los kits intermedios. Las sub-BOMs que no
+        son kits aplican su propia merma en su orden de fabricación y no se acumulan.
+        """
+        self.ensure_one()
+        compounded_factors = {}
+
+        def _visit(bom, factor_above, visited):
+            waste_factors = bom.bom_line_ids._get_waste_factors()
+            for line in bom.bom_line_ids:
+                factor = factor_above * waste_factors[line.id]
+                child_bom = line.child_bom_id
+                if child_bom and child_bom.type == 'phantom' and child_bom not in visited:
+                    _visit(child_bom, factor, visited | child_bom)
+                else:
+                    compounded_factors[line.id] = factor
+
+        _visit(self, 1.0, self)
+        return compounded_factors
+
+    def _apply_waste_percentage(self, waste_percentage):
+        """
+        Asigna el porcentaje de merma a todas las BOMs y recalcula los campos
+        almacenados de sus líneas con una sentencia SQL por tabla.
+
+        Devuelve una tupla (BOMs actualizadas, líneas actualizadas).
+        """
+        if not self:
+            return 0, 0
+        self.flush_model(['waste_percentage'])
+        params = {
+            'ids': tuple(self.ids),
+            'pct': waste_percentage,
+            'uid': self.env.uid,
+        }
+
+        self.env.cr.execute("""
+            UPDATE mrp_bom
+               SET waste_percentage = %(pct)s,
+                   write_uid = %(uid)s,
+                   write_date = (now() at time zone 'UTC')
+             WHERE id IN %(ids)s
+               AND waste_percentage IS DISTINCT FROM %(pct)s
+         RETURNING id
+        """, params)
+        updated_boms = self.browse([row[0] for row in self.env.cr.fetchall()])
+
+        self.invalidate_model(['waste_percentage'])
+        line_count = self.env['mrp.bom.line']._recompute_waste_qty_sql(boms=self)
+        return len(updated_boms), line_count
+
     @api.onchange('waste_percentage')
     def _onchange_waste_percentage(self):
         """Recalcula las mermas cuando cambia el porcentaje"""
         if self.bom_line_ids:
-            for line in self.bom_line_ids:
-                line._compute_waste_qty()
+            self.bom_line_ids._compute_waste_qty()
 
 
 class MrpBomLine(models.Model):
@@ -27,7 +150,7 @@ class MrpBomLine(models.Model):
         compute='_compute_waste_qty',
         store=True,
         digits='Product Unit of Measure',
-        help="Cantidad de merma calculada basada en el porcentaje de merma del BOM"
+        help="Cantidad de merma calculada con el porcentaje del componente, de la regla de su categoría o de la BOM"
     )
     
     total_qty_with_waste = fields.Float(
@@ -38,14 +161,50 @@ class MrpBomLine(models.Model):
         help="Cantidad total incluyendo la merma calculada"
     )
     
-    @api.depends('product_qty', 'bom_id.waste_percentage')
+    has_waste_override = fields.Boolean(
+        string='Merma Propia',
+        default=False,
+        help="Usar un porcentaje de merma propio para este componente en lugar "
+             "del de la regla de su categoría o el de la BOM"
+    )
+
+    waste_percentage_override = fields.Float(
+        string='% Merma del Componente',
+        default=0.0,
+        help="Porcentaje de merma propio de este componente"
+    )
+    
+    @api.depends('product_qty', 'bom_id.waste_percentage', 'has_waste_override',
+                 'waste_percentage_override', 'product_id.categ_id')
     def _compute_waste_qty(self):
-        """Calcula la cantidad de merma basada en el porcentaje del BOM"""
+        """Calcula la cantidad de merma según el porcentaje resuelto para cada línea"""
+        rule_index = self.env['mrp.bom.waste.rule']._get_rule_index()
         for line in self:
-            if line.bom_id.waste_percentage and line.product_qty:
-                line.waste_qty = line.product_qty * (line.bom_id.waste_percentage / 100.0)
+            waste_percentage = line._get_waste_percentage(rule_index)
+            if waste_percentage and line.product_qty:
+                line.waste_qty = line.product_qty * (waste_percentage / 100.0)
             else:
                 line.waste_qty = 0.0
+
+    def _get_waste_percentage(self, rule_index=None):
+        """
+        Resuelve el porcentaje de merma de la línea con esta prioridad:
+        merma propia de la línea, regla de la categoría más cercana del
+        componente (primero la de la compañía, luego la general) y merma de la BOM.
+        """
+        self.ensure_one()
+        if self.has_waste_override:
+            return self.waste_percentage_override
+        if rule_index is None:
+            rule_index = self.env['mrp.bom.waste.rule']._get_rule_index()
+        if rule_index:
+            company_id = self.bom_id.company_id.id
+            parent_path = self.product_id.categ_id.parent_path or ''
+            for categ_id in reversed([int(categ) for categ in parent_path.split('/') if categ]):
+                for key in ((company_id, categ_id), (False, categ_id)):
+                    if key in rule_index:
+                        return rule_index[key]
+        return self.bom_id.waste_percentage
     
     @api.depends('product_qty', 'waste_qty')
     def _compute_total_qty_with_waste(self):
@@ -53,10 +212,136 @@ class MrpBomLine(models.Model):
         for line in self:
             line.total_qty_with_waste = line.product_qty + line.waste_qty
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Propaga el cambio de estructura al factor efectivo de las BOMs padre"""
+        lines = super().create(vals_list)
+        lines.bom_id._invalidate_effective_waste_factor()
+        return lines
+
+    def write(self, vals):
+        """Propaga los cambios de componente o de merma al factor efectivo de las BOMs padre"""
+        result = super().write(vals)
+        tracked_fields = {'product_id', 'product_qty', 'has_waste_override', 'waste_percentage_override'}
+        if tracked_fields.intersection(vals):
+            self.bom_id._invalidate_effective_waste_factor()
+        return result
+
+    def unlink(self):
+        """Propaga la eliminación de componentes al factor efectivo de las BOMs padre"""
+        boms = self.bom_id
+        result = super().unlink()
+        boms.exists()._invalidate_effective_waste_factor()
+        return result
+
+    @api.model
+    def _recompute_waste_qty_sql(self, boms=None, categories=None):
+        """
+        Recalcula con una sola sentencia SQL ``waste_qty`` y ``total_qty_with_waste``
+        de las líneas de las BOMs o de los componentes de las categorías (y sus
+        subcategorías) indicadas, con la misma prioridad que ``_get_waste_percentage``,
+        y marca para recalcular el factor efectivo de las BOMs afectadas y sus padres.
+
+        Devuelve la cantidad de líneas modificadas.
+        """
+        if boms is not None:
+            if not boms:
+                return 0
+            where, params = "l.bom_id IN %(bom_ids)s", {'bom_ids': tuple(boms.ids)}
+        else:
+            if not categories:
+                return 0
+            where = "pc.parent_path LIKE ANY(%(categ_paths)s)"
+            params = {'categ_paths': [categ.parent_path + '%' for categ in categories]}
+        params['digits'] = self.env['decimal.precision'].precision_get('Product Unit of Measure')
+
+        self.flush_model(['bom_id', 'product_id', 'product_qty', 'has_waste_override',
+                          'waste_percentage_override', 'waste_qty', 'total_qty_with_waste'])
+        self.env['mrp.bom'].flush_model(['waste_percentage', 'company_id'])
+        self.env['mrp.bom.waste.rule'].flush_model()
+        self.env.cr.execute("""
+            WITH target AS (
+                SELECT l.id, l.product_qty, l.has_waste_override, l.waste_percentage_override,
+                       b.waste_percentage AS bom_waste_percentage, b.company_id, pc.parent_path
+                  FROM mrp_bom_line l
+                  JOIN mrp_bom b ON b.id = l.bom_id
+                  JOIN product_product pp ON pp.id = l.product_id
+                  JOIN product_template pt ON pt.id = pp.product_tmpl_id
+                  JOIN product_category pc ON pc.id = pt.categ_id
+                 WHERE """ + where + """
+            ), resolved AS (
+                SELECT t.id,
+                       ROUND((COALESCE(t.product_qty, 0) * CASE
+                           WHEN t.has_waste_override THEN COALESCE(t.waste_percentage_override, 0)
+                           ELSE COALESCE(rule.waste_percentage, t.bom_waste_percentage, 0)
+                       END / 100.0)::numeric, %(digits)s) AS waste_qty
+                  FROM target t
+             LEFT JOIN LATERAL (
+                        SELECT r.waste_percentage
+                          FROM mrp_bom_waste_rule r
+                          JOIN product_category rc ON rc.id = r.categ_id
+                         WHERE r.active
+                           AND t.parent_path LIKE rc.parent_path || '%%'
+                           AND (r.company_id IS NULL OR r.company_id = t.company_id)
+                      ORDER BY length(rc.parent_path) DESC, r.company_id IS NULL
+                         LIMIT 1
+                   ) rule ON TRUE
+            )
+            UPDATE mrp_bom_line l
+               SET waste_qty = r.waste_qty,
+                   total_qty_with_waste = ROUND((l.product_qty + r.waste_qty)::numeric, %(digits)s)
+              FROM resolved r
+             WHERE l.id = r.id
+               AND (l.waste_qty IS DISTINCT FROM r.waste_qty
+                    OR l.total_qty_with_waste
+                       IS DISTINCT FROM ROUND((l.product_qty + r.waste_qty)::numeric, %(digits)s))
+         RETURNING l.bom_id
+        """, params)
+        bom_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.invalidate_model(['waste_qty', 'total_qty_with_waste'])
+        if bom_ids:
+            boms = self.env['mrp.bom'].browse(set(bom_ids))
+            boms.invalidate_recordset(['effective_waste_factor'])
+            self.env.add_to_compute(boms._fields['effective_waste_factor'], boms)
+            boms._invalidate_effective_waste_factor()
+        return len(bom_ids)
+
+    def _get_waste_factors(self):
+        """
+        Devuelve un diccionario {id de línea: factor de merma} leyendo todas las
+        líneas en una sola consulta. El factor es 1.0 cuando la línea no tiene merma.
+        """
+        self.fetch(['product_qty', 'total_qty_with_waste'])
+        return {
+            line.id: line.total_qty_with_waste / line.product_qty
+            if line.product_qty > 0 and line.total_qty_with_waste else 1.0
+            for line in self
+        }
+
 
 class MrpProduction(models.Model):
     _inherit = 'mrp.production'
     
+    def _get_moves_raw_values(self):
+        """
+        Precarga los factores de merma de todas las líneas BOM de las órdenes
+        (una vez por BOM, incluyendo la merma acumulada de los kits) para no
+        releer las mismas líneas por cada orden y componente.
+
+        Los factores se indexan por (BOM de la orden, línea): un mismo kit usado
+        en varias BOMs acumula una merma distinta en cada una. Las BOMs cuyo factor
+        efectivo almacenado es 1.0 no tienen merma en ningún nivel y se omiten.
+        """
+        waste_factors = {}
+        for bom in self.bom_id.filtered(lambda b: b.effective_waste_factor != 1.0):
+            waste_factors.update({
+                (bom.id, line_id): factor
+                for line_id, factor in bom._get_compounded_waste_factors().items()
+            })
+        return super(
+            MrpProduction, self.with_context(bom_line_waste_factors=waste_factors)
+        )._get_moves_raw_values()
+
     def _get_move_raw_values(self, product_id, product_uom_qty, product_uom, operation_id=False, bom_line=False):
         """
         Sobrescribe el método para incluir la merma en las cantidades de materias primas
@@ -66,31 +351,13 @@ class MrpProduction(models.Model):
         )
         
         # Si hay una línea BOM con merma, ajustar la cantidad
-        if bom_line and hasattr(bom_line, 'total_qty_with_waste') and bom_line.total_qty_with_waste:
-            # Calcular el factor de escala basado en la cantidad de producción
-            if bom_line.product_qty > 0:
-                scale_factor = values.get('product_uom_qty', product_uom_qty) / bom_line.product_qty
-                # Aplicar la cantidad total con merma escalada
-                values['product_uom_qty'] = bom_line.total_qty_with_waste * scale_factor
+        if bom_line and self.bom_id.effective_waste_factor != 1.0:
+            waste_factors = self.env.context.get('bom_line_waste_factors') or {}
+            waste_factor = waste_factors.get((self.bom_id.id, bom_line.id))
+            if waste_factor is None:
+                # Línea fuera de la precarga (p. ej. de un kit): leerla directamente
+                waste_factor = bom_line._get_waste_factors()[bom_line.id]
+            if waste_factor != 1.0:
+                values['product_uom_qty'] = values.get('product_uom_qty', product_uom_qty) * waste_factor
         
         return values
-    
-    @api.model
-    def _get_bom_data(self, bom, warehouse, product=False, product_qty=1, child_bom_ids=[], level=0, parent_bom=False):
-        """
-        Sobrescribe para incluir información de merma en los datos del BOM
-        """
-        data = super()._get_bom_data(bom, warehouse, product, product_qty, child_bom_ids, level, parent_bom)
-        
-        # Agregar información de merma
-        if hasattr(bom, 'waste_percentage'):
-            data['waste_percentage'] = bom.waste_percentage
-            
-        # Actualizar las líneas con información de merma
-        for line_data in data.get('lines', []):
-            bom_line = self.env['mrp.bom.line'].browse(line_data.get('line_id'))
-            if bom_line and hasattr(bom_line, 'waste_qty'):
-                line_data['waste_qty'] = bom_line.waste_qty
-                line_data['total_qty_with_waste'] = bom_line.total_qty_with_waste
-                
-        return data
\ No newline at end of file
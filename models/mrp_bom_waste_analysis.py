@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+from dateutil.relativedelta import relativedelta
+
+
+class MrpBomWasteAnalysis(models.Model):
+    """Análisis de merma real: consumo planificado vs. consumo real por componente"""
+    _name = 'mrp.bom.waste.analysis'
+    _description = 'Análisis de Merma Real por Componente'
+    _log_access = False
+    _order = 'bom_id, product_id'
+
+    bom_id = fields.Many2one(
+        'mrp.bom',
+        string='Lista de Materiales',
+        readonly=True,
+        ondelete='cascade'
+    )
+
+    bom_line_id = fields.Many2one(
+        'mrp.bom.line',
+        string='Línea BOM',
+        readonly=True,
+        ondelete='cascade'
+    )
+
+    product_id = fields.Many2one(
+        'product.product',
+        string='Componente',
+        readonly=True
+    )
+
+    product_uom_id = fields.Many2one(
+        'uom.uom',
+        string='Unidad de Medida',
+        readonly=True
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Compañía',
+        readonly=True
+    )
+
+    date_from = fields.Date(string='Desde', readonly=True)
+
+    date_to = fields.Date(string='Hasta', readonly=True)
+
+    analysis_date = fields.Datetime(string='Fecha de Análisis', readonly=True)
+
+    production_count = fields.Integer(
+        string='# Órdenes',
+        readonly=True,
+        aggregator='sum'
+    )
+
+    planned_qty = fields.Float(
+        string='Consumo Planificado',
+        readonly=True,
+        digits='Product Unit of Measure',
+        help='Cantidad según la BOM (sin merma) para las cantidades fabricadas'
+    )
+
+    consumed_qty = fields.Float(
+        string='Consumo Real',
+        readonly=True,
+        digits='Product Unit of Measure',
+        help='Cantidad realmente consumida en las órdenes terminadas'
+    )
+
+    consumption_ratio = fields.Float(
+        string='Ratio Real/Planificado',
+        readonly=True,
+        digits=(16, 4),
+        aggregator='avg'
+    )
+
+    current_waste_percentage = fields.Float(
+        string='% Merma Actual',
+        readonly=True,
+        aggregator='avg'
+    )
+
+    suggested_waste_percentage = fields.Float(
+        string='% Merma Sugerida',
+        readonly=True,
+        aggregator='avg',
+        help='Merma observada: (consumo real / consumo planificado - 1) × 100'
+    )
+
+    waste_stddev = fields.Float(
+        string='Desviación (%)',
+        readonly=True,
+        aggregator='avg',
+        help='Desviación estándar de la merma observada entre órdenes, en puntos porcentuales'
+    )
+
+    @api.model
+    def _run_analysis(self, date_from, date_to):
+        """
+        Recalcula el análisis para las órdenes terminadas en la ventana
+        [date_from, date_to) con una única consulta agrupada sobre los movimientos.
+
+        El consumo planificado se escala por la cantidad realmente producida (los
+        movimientos terminados hechos), no por la cantidad planificada de la orden.
+        Los componentes de kits se excluyen: su línea pertenece a la sub-BOM y su
+        cantidad no es comparable con la de la BOM de la orden.
+        """
+        self.env['stock.move'].flush_model([
+            'raw_material_production_id', 'production_id', 'bom_line_id', 'product_id',
+            'product_uom', 'quantity', 'state',
+        ])
+        self.env['mrp.production'].flush_model([
+            'bom_id', 'product_id', 'state', 'date_finished', 'product_uom_id', 'company_id',
+        ])
+        self.env.cr.execute("DELETE FROM mrp_bom_waste_analysis")
+        self.env.cr.execute("""
+            WITH produced AS (
+                SELECT mp.id AS production_id,
+                       SUM(fm.quantity / fm_uom.factor * mp_uom.factor) AS qty
+                  FROM mrp_production mp
+                  JOIN stock_move fm ON fm.production_id = mp.id
+                                    AND fm.product_id = mp.product_id
+                                    AND fm.state = 'done'
+                  JOIN uom_uom fm_uom ON fm_uom.id = fm.product_uom
+                  JOIN uom_uom mp_uom ON mp_uom.id = mp.product_uom_id
+                 WHERE mp.state = 'done'
+                   AND mp.date_finished >= %(date_from)s
+                   AND mp.date_finished < %(date_to)s
+              GROUP BY mp.id
+            ),
+            per_production AS (
+                SELECT mp.id AS production_id,
+                       mp.bom_id,
+                       sm.bom_line_id,
+                       sm.product_id,
+                       pt.uom_id AS product_uom_id,
+                       mp.company_id,
+                       b.waste_percentage,
+                       SUM(sm.quantity / move_uom.factor * product_uom.factor) AS consumed_qty,
+                       MAX(bl.product_qty / line_uom.factor * product_uom.factor
+                           * (produced.qty / mp_uom.factor * bom_uom.factor)
+                           / NULLIF(b.product_qty, 0)) AS planned_qty
+                  FROM stock_move sm
+                  JOIN mrp_production mp ON mp.id = sm.raw_material_production_id
+                  JOIN mrp_bom b ON b.id = mp.bom_id
+                  JOIN mrp_bom_line bl ON bl.id = sm.bom_line_id
+                  JOIN product_product pp ON pp.id = sm.product_id
+                  JOIN product_template pt ON pt.id = pp.product_tmpl_id
+                  JOIN uom_uom move_uom ON move_uom.id = sm.product_uom
+                  JOIN uom_uom line_uom ON line_uom.id = bl.product_uom_id
+                  JOIN uom_uom product_uom ON product_uom.id = pt.uom_id
+                  JOIN uom_uom mp_uom ON mp_uom.id = mp.product_uom_id
+                  JOIN uom_uom bom_uom ON bom_uom.id = b.product_uom_id
+                  JOIN produced ON produced.production_id = mp.id
+                 WHERE mp.state = 'done'
+                   AND sm.state = 'done'
+                   AND bl.bom_id = mp.bom_id
+                   AND mp.date_finished >= %(date_from)s
+                   AND mp.date_finished < %(date_to)s
+              GROUP BY mp.id, mp.bom_id, sm.bom_line_id, sm.product_id, pt.uom_id,
+                       mp.company_id, b.waste_percentage
+            )
+            INSERT INTO mrp_bom_waste_analysis (
+                bom_id, bom_line_id, product_id, product_uom_id, company_id,
+                date_from, date_to, analysis_date, production_count,
+                planned_qty, consumed_qty, consumption_ratio,
+                current_waste_percentage, suggested_waste_percentage, waste_stddev
+            )
+            SELECT bom_id, bom_line_id, product_id, product_uom_id, company_id,
+                   %(date_from)s, %(date_to)s, (now() at time zone 'UTC'), count(*),
+                   SUM(planned_qty), SUM(consumed_qty),
+                   SUM(consumed_qty) / SUM(planned_qty),
+                   MAX(waste_percentage),
+                   GREATEST((SUM(consumed_qty) / SUM(planned_qty) - 1) * 100, 0),
+                   COALESCE(STDDEV_SAMP((consumed_qty / planned_qty - 1) * 100), 0)
+              FROM per_production
+             WHERE planned_qty > 0
+          GROUP BY bom_id, bom_line_id, product_id, product_uom_id, company_id
+        """, {'date_from': date_from, 'date_to': date_to})
+        self.invalidate_model()
+
+    @api.model
+    def _cron_run_analysis(self, months=12):
+        """Cron: recalcula el análisis de merma de los últimos meses"""
+        date_to = fields.Date.context_today(self) + relativedelta(days=1)
+        date_from = date_to - relativedelta(months=months)
+        self._run_analysis(date_from, date_to)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, tools
+
+
+class MrpBomWasteRule(models.Model):
+    """Porcentaje de merma por categoría de producto de los componentes"""
+    _name = 'mrp.bom.waste.rule'
+    _description = 'Regla de Merma por Categoría de Producto'
+    _order = 'categ_id'
+
+    categ_id = fields.Many2one(
+        'product.category',
+        string='Categoría de Producto',
+        required=True,
+        ondelete='cascade',
+        help='La regla se aplica a los componentes de esta categoría y de sus subcategorías'
+    )
+
+    waste_percentage = fields.Float(
+        string='Porcentaje de Merma (%)',
+        required=True,
+        default=0.0,
+        help="Reemplaza el porcentaje de merma de la BOM para los componentes de la categoría. "
+             "La merma definida directamente en la línea BOM tiene prioridad sobre esta regla"
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Compañía',
+        help='Dejar vacío para aplicar la regla en todas las compañías'
+    )
+
+    active = fields.Boolean(
+        string='Activo',
+        default=True
+    )
+
+    _sql_constraints = [
+        ('categ_company_unique', 'unique(categ_id, company_id)',
+         'Ya existe una regla de merma para esta categoría en esta compañía!'),
+    ]
+
+    @api.model
+    @tools.ormcache()
+    def _get_rule_index(self):
+        """
+        Devuelve el índice {(compañía, categoría): porcentaje} de las reglas activas.
+
+        Se carga una sola vez y queda en caché hasta que cambia alguna regla;
+        el diccionario devuelto es compartido y no debe modificarse.
+        """
+        rules = self.sudo().search_read([], ['categ_id', 'company_id', 'waste_percentage'])
+        return {
+            (rule['company_id'] and rule['company_id'][0], rule['categ_id'][0]): rule['waste_percentage']
+            for rule in rules
+        }
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Recalcula las mermas de los componentes de las categorías afectadas"""
+        rules = super().create(vals_list)
+        rules._recompute_bom_lines(rules.categ_id)
+        return rules
+
+    def write(self, vals):
+        """Recalcula las mermas de los componentes de las categorías afectadas"""
+        categories = self.categ_id
+        result = super().write(vals)
+        self._recompute_bom_lines(categories | self.categ_id)
+        return result
+
+    def unlink(self):
+        """Recalcula las mermas de los componentes de las categorías afectadas"""
+        categories = self.categ_id
+        result = super().unlink()
+        self._recompute_bom_lines(categories)
+        return result
+
+    def _recompute_bom_lines(self, categories):
+        """Vacía el índice en caché y recalcula con SQL las líneas BOM de las categorías"""
+        self.env.registry.clear_cache()
+        self.flush_model()
+        self.env['mrp.bom.line']._recompute_waste_qty_sql(categories=categories)
@@ -1,4 +1,7 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, Command
+from odoo.exceptions import UserError
+from odoo.tools import str2bool
+from collections import defaultdict
 
 
 class MrpProduction(models.Model):
@@ -17,6 +20,7 @@ class MrpProduction(models.Model):
         string='Cliente',
         related='sale_order_id.partner_id',
         store=True,
+        index=True,
         readonly=True,
         help="Cliente de la orden de venta relacionada"
     )
@@ -26,6 +30,7 @@ class MrpProduction(models.Model):
         string='Distribuidor',
         related='sale_order_id.distributor_id',
         store=True,
+        index=True,
         readonly=True,
         help="Distribuidor de la orden de venta relacionada"
     )
@@ -51,6 +56,7 @@ class MrpProduction(models.Model):
         related='product_id.categ_id', 
         string='Categoría de Producto', 
         store=True, 
+        index=True,
         readonly=True)
 
     has_sale_order = fields.Boolean(
@@ -70,7 +76,11 @@ class MrpProduction(models.Model):
     
     raw_material_picking_ids = fields.Many2many(
         'stock.picking',
+        'mrp_production_raw_picking_rel',
+        'production_id',
+        'picking_id',
         compute='_compute_raw_material_picking_ids',
+        store=True,
         string='Traslados de MP',
         help="Traslados de materia prima relacionados a esta orden"
     )
@@ -78,26 +88,60 @@ class MrpProduction(models.Model):
     raw_material_picking_count = fields.Integer(
         string='# Traslados MP',
         compute='_compute_raw_material_picking_ids',
+        store=True,
+    )
+
+    has_pending_raw_material_picking = fields.Boolean(
+        string='Traslados MP Pendientes',
+        compute='_compute_has_pending_raw_material_picking',
+        store=True,
+        index=True,
+        help="Indica si la orden tiene traslados de materia prima sin terminar"
     )
     
-    @api.depends('picking_ids')
+    @api.depends('procurement_group_id')
     def _compute_raw_material_picking_ids(self):
-        """Calcula los traslados de materia prima relacionados"""
+        """Calcula los traslados de materia prima relacionados
+
+        Los traslados se leen con una sola consulta agrupada por grupo de
+        abastecimiento y tipo de operación para todo el conjunto de órdenes.
+        """
+        pickings_by_group = defaultdict(list)
+        groups = self.procurement_group_id
+        if groups:
+            picking_groups = self.env['stock.picking']._read_group(
+                [('group_id', 'in', groups.ids)],
+                ['group_id', 'picking_type_id'],
+                ['id:array_agg'],
+            )
+            for group, picking_type, picking_ids in picking_groups:
+                pickings_by_group[group.id].append((picking_type.code, picking_ids))
+
         for production in self:
-            # Usar el campo picking_ids que ya existe en Odoo
+            picking_data = pickings_by_group.get(production.procurement_group_id.id, [])
+
             # Primero intentar con pickings internos
-            pickings = production.picking_ids.filtered(
-                lambda p: p.picking_type_id.code == 'internal'
-            )
-            
+            picking_ids = [
+                pid for code, ids in picking_data if code == 'internal' for pid in ids
+            ]
+
             # Si no hay pickings internos, tomar todos excepto outgoing (entregas)
-            if not pickings:
-                pickings = production.picking_ids.filtered(
-                    lambda p: p.picking_type_id.code != 'outgoing'
-                )
-            
-            production.raw_material_picking_ids = pickings
-            production.raw_material_picking_count = len(pickings)
+            if not picking_ids:
+                picking_ids = [
+                    pid for code, ids in picking_data if code != 'outgoing' for pid in ids
+                ]
+
+            production.raw_material_picking_ids = [(6, 0, picking_ids)]
+            production.raw_material_picking_count = len(picking_ids)
+
+    @api.depends('raw_material_picking_ids.state')
+    def _compute_has_pending_raw_material_picking(self):
+        """Determina si hay traslados de materia prima sin terminar"""
+        for production in self:
+            production.has_pending_raw_material_picking = any(
+                picking.state not in ('done', 'cancel')
+                for picking in production.raw_material_picking_ids
+            )
     
     @api.depends('sale_order_id')
     def _compute_has_sale_order(self):
@@ -105,15 +149,196 @@ class MrpProduction(models.Model):
         for production in self:
             production.has_sale_order = bool(production.sale_order_id)
     
-    @api.model
-    def create(self, values):
-        """Sobrescribe el método create para asignar la orden de venta automáticamente"""
-        # Si se crea desde una orden de venta, el context tendrá el sale_order_id
-        if not values.get('sale_order_id'):
-            sale_order_id = self.env.context.get('default_sale_order_id')
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Sobrescribe el método create para asignar la orden de venta automáticamente
+
+        La orden de venta se toma del contexto (creación desde una venta), del
+        grupo de abastecimiento o del grupo de los movimientos destino, leyendo
+        todos los grupos y movimientos en una consulta por modelo.
+        """
+        default_sale_order_id = self.env.context.get('default_sale_order_id')
+        sale_order_ids = self._get_sale_order_ids_from_vals(vals_list)
+        for values, sale_order_id in zip(vals_list, sale_order_ids):
+            if values.get('sale_order_id'):
+                continue
+            sale_order_id = default_sale_order_id or sale_order_id
             if sale_order_id:
                 values['sale_order_id'] = sale_order_id
-        return super(MrpProduction, self).create(values)
+        return super(MrpProduction, self).create(vals_list)
+
+    @api.model
+    def _get_sale_order_ids_from_vals(self, vals_list):
+        """
+        Devuelve, en el orden de ``vals_list``, la orden de venta del grupo de
+        abastecimiento de cada orden o, si no tiene, la del grupo de sus
+        movimientos destino (False si no se encuentra ninguna).
+        """
+        group_ids = set()
+        dest_ids_list = []
+        for values in vals_list:
+            dest_ids = []
+            if not values.get('sale_order_id'):
+                if values.get('procurement_group_id'):
+                    group_ids.add(values['procurement_group_id'])
+                dest_ids = self._get_linked_ids(values.get('move_dest_ids'))
+            dest_ids_list.append(dest_ids)
+
+        dest_moves = self.env['stock.move'].browse({move_id for ids in dest_ids_list for move_id in ids})
+        dest_moves.fetch(['group_id'])
+        groups = self.env['procurement.group'].browse(group_ids) | dest_moves.group_id
+        groups.fetch(['sale_id'])
+
+        sale_order_ids = []
+        for values, dest_ids in zip(vals_list, dest_ids_list):
+            group = self.env['procurement.group'].browse(values.get('procurement_group_id') or [])
+            sale_order = group.sale_id or self.env['stock.move'].browse(dest_ids).group_id.sale_id[:1]
+            sale_order_ids.append(sale_order.id)
+        return sale_order_ids
+
+    @api.model
+    def _get_linked_ids(self, commands):
+        """Devuelve los ids enlazados por los comandos x2many LINK y SET"""
+        ids = []
+        for command in commands or []:
+            if command[0] == Command.LINK:
+                ids.append(command[1])
+            elif command[0] == Command.SET:
+                ids.extend(command[2])
+        return ids
+
+    @api.model
+    def _cron_backfill_sale_order(self, batch_size=5000):
+        """
+        Completa la orden de venta de las órdenes de fabricación históricas.
+
+        Procesa un bloque de ``batch_size`` órdenes por llamada, ordenado por id,
+        y guarda el último id procesado en un parámetro del sistema para poder
+        reanudar tras una caída. El cron confirma cada bloque y se vuelve a
+        disparar mientras queden órdenes; al terminar, los campos almacenados
+        de la venta se recalculan en una sola sentencia.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        last_id = int(params.get_param('peruanita_mrp.sale_order_backfill_last_id', 0))
+        self.flush_model(['sale_order_id', 'procurement_group_id', 'origin', 'company_id'])
+
+        self.env.cr.execute("""
+            SELECT max(id), count(*)
+              FROM (SELECT id FROM mrp_production WHERE id > %s ORDER BY id LIMIT %s) chunk
+        """, (last_id, batch_size))
+        stop_id, chunk_count = self.env.cr.fetchone()
+
+        if not chunk_count:
+            self._backfill_sale_order_stored_fields()
+            self.env['ir.cron']._notify_progress(done=0, remaining=0, deactivate=True)
+            return
+
+        self.env.cr.execute("""
+            UPDATE mrp_production mp
+               SET sale_order_id = resolved.sale_order_id
+              FROM (
+                    SELECT p.id,
+                           COALESCE(pg.sale_id, dest.sale_id, origin_so.id) AS sale_order_id
+                      FROM mrp_production p
+                 LEFT JOIN procurement_group pg ON pg.id = p.procurement_group_id
+                 LEFT JOIN LATERAL (
+                            SELECT dest_pg.sale_id
+                              FROM stock_move fm
+                              JOIN stock_move_move_rel rel ON rel.move_orig_id = fm.id
+                              JOIN stock_move dm ON dm.id = rel.move_dest_id
+                              JOIN procurement_group dest_pg ON dest_pg.id = dm.group_id
+                             WHERE fm.production_id = p.id
+                               AND dest_pg.sale_id IS NOT NULL
+                             LIMIT 1
+                       ) dest ON TRUE
+                 LEFT JOIN LATERAL (
+                            SELECT so.id
+                              FROM sale_order so
+                             WHERE so.name = p.origin
+                               AND so.company_id = p.company_id
+                             LIMIT 1
+                       ) origin_so ON TRUE
+                     WHERE p.id > %(start)s AND p.id <= %(stop)s
+                       AND p.sale_order_id IS NULL
+                   ) resolved
+             WHERE mp.id = resolved.id
+               AND resolved.sale_order_id IS NOT NULL
+        """, {'start': last_id, 'stop': stop_id})
+        self.invalidate_model(['sale_order_id'])
+
+        params.set_param('peruanita_mrp.sale_order_backfill_last_id', stop_id)
+        self.env.cr.execute("SELECT count(*) FROM mrp_production WHERE id > %s", (stop_id,))
+        remaining = self.env.cr.fetchone()[0]
+        if not remaining:
+            self._backfill_sale_order_stored_fields()
+        self.env['ir.cron']._notify_progress(done=chunk_count, remaining=remaining)
+
+    @api.model
+    def _backfill_sale_order_stored_fields(self):
+        """Recalcula en bloque cliente, distribuidor y el indicador de venta de todas las órdenes"""
+        self.env['sale.order'].flush_model(['partner_id', 'distributor_id'])
+        self.env.cr.execute("""
+            UPDATE mrp_production mp
+               SET sale_partner_id = so.partner_id,
+                   sale_distributor_id = so.distributor_id,
+                   has_sale_order = TRUE
+              FROM sale_order so
+             WHERE so.id = mp.sale_order_id
+               AND (mp.sale_partner_id IS DISTINCT FROM so.partner_id
+                    OR mp.sale_distributor_id IS DISTINCT FROM so.distributor_id
+                    OR mp.has_sale_order IS NOT TRUE)
+        """)
+        self.invalidate_model(['sale_partner_id', 'sale_distributor_id', 'has_sale_order'])
+
+    @api.model
+    def _get_deferred_related_fields(self):
+        """Campos relacionados almacenados cuyo recálculo puede diferirse al cron"""
+        return ['sale_partner_id', 'sale_distributor_id', 'categ_id']
+
+    @api.model
+    def _is_related_recompute_deferred(self):
+        """Indica si el recálculo de los campos relacionados se difiere al cron.
+
+        Se activa con el parámetro del sistema ``peruanita_mrp.defer_related_recompute``
+        o, puntualmente, con la clave de contexto ``defer_mrp_related_recompute``.
+        """
+        if 'defer_mrp_related_recompute' in self.env.context:
+            return bool(self.env.context['defer_mrp_related_recompute'])
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param(
+            'peruanita_mrp.defer_related_recompute', 'False'
+        ))
+
+    @api.model
+    def _get_related_records_to_compute(self, fnames):
+        """Devuelve las órdenes ya marcadas para recalcular, antes de una escritura"""
+        if not self._is_related_recompute_deferred():
+            return {}
+        return {fname: self.env.records_to_compute(self._fields[fname]) for fname in fnames}
+
+    @api.model
+    def _defer_related_recompute(self, fnames, pending):
+        """Saca del recálculo síncrono las órdenes marcadas por una escritura y las encola.
+
+        Solo se difieren las órdenes marcadas por la escritura en curso; las que
+        ya estaban pendientes (p. ej. órdenes recién creadas) se recalculan como siempre.
+        """
+        if not self._is_related_recompute_deferred():
+            return
+        production_ids = set()
+        for fname in fnames:
+            field = self._fields[fname]
+            productions = self.env.records_to_compute(field) - pending.get(fname, self.browse())
+            if productions:
+                self.env.remove_to_compute(field, productions)
+                production_ids.update(productions.ids)
+        self.env['mrp.production.recompute.queue']._enqueue(production_ids)
+
+    def button_mark_done(self):
+        """Verifica los certificados de calidad de los lotes consumidos antes de terminar"""
+        expired_lines = self.move_raw_ids.move_line_ids._check_lot_certificates()
+        result = super(MrpProduction, self).button_mark_done()
+        expired_lines._post_lot_certificate_warnings()
+        return result
 
     def action_view_sale_order(self):
         """Acción para ver la orden de venta relacionada"""
@@ -179,25 +404,7 @@ class MrpProduction(models.Model):
         Sobrescribe el método estándar de fusión para consolidar los partners
         """
         # Recopilar todos los partners y distribuidores antes de la fusión
-        all_partners = self.env['res.partner']
-        all_distributors = self.env['res.partner']
-
-        for production in self:
-            # Agregar el partner actual si existe
-            if production.sale_partner_id:
-                all_partners |= production.sale_partner_id
-
-            # Agregar el distribuidor actual si existe
-            if production.sale_distributor_id:
-                all_distributors |= production.sale_distributor_id
-
-            # Agregar partners ya consolidados previamente
-            if production.consolidated_partner_ids:
-                all_partners |= production.consolidated_partner_ids
-
-            # Agregar distribuidores ya consolidados previamente
-            if production.consolidated_distributor_ids:
-                all_distributors |= production.consolidated_distributor_ids
+        partner_ids, distributor_ids = self._get_consolidated_partner_ids()
 
         # Llamar al método padre para hacer la fusión estándar
         result = super(MrpProduction, self).action_merge()
@@ -208,12 +415,76 @@ class MrpProduction(models.Model):
 
             # Asignar los partners consolidados a la nueva orden
             vals = {}
-            if all_partners:
-                vals['consolidated_partner_ids'] = [(6, 0, all_partners.ids)]
-            if all_distributors:
-                vals['consolidated_distributor_ids'] = [(6, 0, all_distributors.ids)]
+            if partner_ids:
+                vals['consolidated_partner_ids'] = [(6, 0, partner_ids)]
+            if distributor_ids:
+                vals['consolidated_distributor_ids'] = [(6, 0, distributor_ids)]
 
             if vals:
                 new_production.write(vals)
 
-        return result
\ No newline at end of file
+        return result
+
+    def _get_consolidated_partner_ids(self):
+        """
+        Devuelve los ids de clientes y distribuidores de las órdenes, incluyendo
+        los ya consolidados en fusiones anteriores, con una consulta por tabla de relación.
+        """
+        if not self.ids:
+            return [], []
+        self.flush_recordset([
+            'sale_partner_id', 'sale_distributor_id',
+            'consolidated_partner_ids', 'consolidated_distributor_ids',
+        ])
+        ids = tuple(self.ids)
+        self.env.cr.execute("""
+            SELECT sale_partner_id FROM mrp_production
+             WHERE id IN %(ids)s AND sale_partner_id IS NOT NULL
+             UNION
+            SELECT partner_id FROM mrp_production_partner_rel
+             WHERE production_id IN %(ids)s
+        """, {'ids': ids})
+        partner_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env.cr.execute("""
+            SELECT sale_distributor_id FROM mrp_production
+             WHERE id IN %(ids)s AND sale_distributor_id IS NOT NULL
+             UNION
+            SELECT distributor_id FROM mrp_production_distributor_rel
+             WHERE production_id IN %(ids)s
+        """, {'ids': ids})
+        distributor_ids = [row[0] for row in self.env.cr.fetchall()]
+        return partner_ids, distributor_ids
+
+    def action_merge_by_product(self):
+        """
+        Fusiona en una sola operación las órdenes seleccionadas compatibles,
+        agrupándolas por compañía, producto, lista de materiales y tipo de operación.
+        """
+        groups = self._read_group(
+            [
+                ('id', 'in', self.ids),
+                ('state', 'in', ('draft', 'confirmed')),
+                ('bom_id', '!=', False),
+            ],
+            ['company_id', 'product_id', 'bom_id', 'picking_type_id'],
+            ['id:recordset'],
+        )
+        merged_ids = []
+        for _company, _product, _bom, _picking_type, productions in groups:
+            if len(productions) < 2:
+                continue
+            result = productions.action_merge()
+            if result and result.get('res_id'):
+                merged_ids.append(result['res_id'])
+
+        if not merged_ids:
+            raise UserError('No se encontraron órdenes compatibles para fusionar.')
+
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Órdenes Fusionadas',
+            'res_model': 'mrp.production',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', merged_ids)],
+            'target': 'current',
+        }
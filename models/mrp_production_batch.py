@@ -96,23 +96,8 @@ class MrpProductionBatchWizard(models.TransientModel):
         
         res['production_ids'] = [(6, 0, production_ids)]
         
-        # Buscar los pickings relacionados (traslados de materia prima)
-        all_pickings = self.env['stock.picking']
-        for production in productions:
-            # Usar el campo picking_ids que ya existe en mrp.production
-            # Primero intentar con pickings internos
-            pickings = production.picking_ids.filtered(
-                lambda p: p.picking_type_id.code == 'internal'
-            )
-            
-            # Si no hay pickings internos, tomar todos los pickings
-            # que no sean de tipo 'outgoing' (entregas a clientes)
-            if not pickings:
-                pickings = production.picking_ids.filtered(
-                    lambda p: p.picking_type_id.code != 'outgoing'
-                )
-            
-            all_pickings |= pickings
+        # Traslados de materia prima ya calculados y almacenados en las órdenes
+        all_pickings = productions.raw_material_picking_ids
         
         if not all_pickings:
             raise UserError(
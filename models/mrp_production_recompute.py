@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+
+
+class MrpProductionRecomputeQueue(models.Model):
+    """Cola de órdenes de fabricación pendientes de recalcular sus campos relacionados"""
+    _name = 'mrp.production.recompute.queue'
+    _description = 'Cola de Recálculo Diferido de Órdenes de Fabricación'
+    _log_access = False
+    _order = 'id'
+
+    production_id = fields.Many2one(
+        'mrp.production',
+        string='Orden de Fabricación',
+        required=True,
+        ondelete='cascade',
+    )
+
+    _sql_constraints = [
+        ('production_unique', 'unique(production_id)',
+         'La orden de fabricación ya está en la cola de recálculo!'),
+    ]
+
+    @api.model
+    def _enqueue(self, production_ids):
+        """Agrega las órdenes a la cola con una sola sentencia, ignorando las ya encoladas"""
+        if not production_ids:
+            return
+        self.env.cr.execute("""
+            INSERT INTO mrp_production_recompute_queue (production_id)
+                 SELECT unnest(%s::int[])
+            ON CONFLICT (production_id) DO NOTHING
+        """, (list(production_ids),))
+
+    @api.model
+    def _cron_process_queue(self, batch_size=1000):
+        """
+        Recalcula en lotes los campos relacionados almacenados de las órdenes encoladas.
+
+        Cada llamada procesa hasta ``batch_size`` órdenes; el cron confirma el
+        lote y se vuelve a disparar mientras queden órdenes en la cola.
+        """
+        self.env.cr.execute("""
+            SELECT id, production_id
+              FROM mrp_production_recompute_queue
+          ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, (batch_size,))
+        rows = self.env.cr.fetchall()
+        if not rows:
+            self.env['ir.cron']._notify_progress(done=0, remaining=0)
+            return
+
+        Production = self.env['mrp.production']
+        productions = Production.browse([production_id for _queue_id, production_id in rows]).exists()
+        fnames = Production._get_deferred_related_fields()
+        for fname in fnames:
+            self.env.add_to_compute(Production._fields[fname], productions)
+        productions.flush_recordset(fnames)
+
+        self.env.cr.execute(
+            "DELETE FROM mrp_production_recompute_queue WHERE id IN %s",
+            (tuple(queue_id for queue_id, _production_id in rows),)
+        )
+        self.env.cr.execute("SELECT count(*) FROM mrp_production_recompute_queue")
+        remaining = self.env.cr.fetchone()[0]
+        self.env['ir.cron']._notify_progress(done=len(rows), remaining=remaining)
+
+
+class SaleOrder(models.Model):
+    _inherit = 'sale.order'
+
+    def write(self, vals):
+        """Difiere el recálculo de cliente/distribuidor en las órdenes de fabricación"""
+        fnames = [
+            fname for trigger, fname in (
+                ('partner_id', 'sale_partner_id'),
+                ('distributor_id', 'sale_distributor_id'),
+            ) if trigger in vals
+        ]
+        if not fnames:
+            return super().write(vals)
+        Production = self.env['mrp.production']
+        pending = Production._get_related_records_to_compute(fnames)
+        result = super().write(vals)
+        Production._defer_related_recompute(fnames, pending)
+        return result
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    def write(self, vals):
+        """Difiere el recálculo de la categoría en las órdenes de fabricación"""
+        if 'categ_id' not in vals:
+            return super().write(vals)
+        Production = self.env['mrp.production']
+        pending = Production._get_related_records_to_compute(['categ_id'])
+        result = super().write(vals)
+        Production._defer_related_recompute(['categ_id'], pending)
+        return result
@@ -1,7 +1,14 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
 from dateutil.relativedelta import relativedelta
-from datetime import datetime, timedelta
+from odoo.exceptions import UserError
+from odoo.osv import expression
+
+# Días antes del vencimiento en que el certificado pasa a "Por Vencer"
+EXPIRY_WARNING_DAYS = 15
+
+# Clave de la caché por transacción de fechas de vencimiento por (lote, compañía)
+LOT_CERTIFICATE_CACHE_KEY = 'peruanita_mrp.lot_certificate_expiry'
 
 
 class ProductLotQuality(models.Model):
@@ -92,6 +99,21 @@ class ProductLotQuality(models.Model):
         required=True
     )
 
+    renewal_draft = fields.Boolean(
+        string='Borrador de Renovación',
+        readonly=True,
+        help='Renovación creada automáticamente al archivar el certificado vencido. '
+             'Conserva las fechas del certificado anterior hasta que se confirme con el nuevo certificado del laboratorio'
+    )
+
+    renewed_from_id = fields.Many2one(
+        'product.lot.quality',
+        string='Renueva a',
+        readonly=True,
+        ondelete='set null',
+        help='Certificado vencido y archivado que este borrador renueva'
+    )
+
     # Campo calculado para mostrar el producto con variantes
     product_display_name = fields.Char(
         string='Producto',
@@ -134,100 +156,215 @@ class ProductLotQuality(models.Model):
                 record.state = 'valid'
             elif record.days_to_expire < 0:
                 record.state = 'expired'
-            elif record.days_to_expire <= 15:  # Alerta 15 días antes
+            elif record.days_to_expire <= EXPIRY_WARNING_DAYS:
                 record.state = 'warning'
             else:
                 record.state = 'valid'
 
     @api.model
-    def _cron_check_expiring_certificates(self):
+    def _refresh_expiry_state(self):
         """
-        Cron job que verifica certificados por vencer y crea actividades
-        para administradores del módulo de manufactura
+        Recalcula ``days_to_expire`` y ``state`` de los certificados activos respecto
+        a la fecha de hoy, con una sentencia SQL por compañía. Ambos campos se
+        almacenan al escribir la fecha de vencimiento y sin este refresco quedan
+        desactualizados con el paso de los días.
         """
-        # Buscar certificados que vencen en los próximos 15 días y aún no tienen actividad
-        warning_date = fields.Date.context_today(self) + timedelta(days=15)
-        expiring_certificates = self.search([
-            ('certificate_expiry_date', '<=', warning_date),
-            ('certificate_expiry_date', '>=', fields.Date.context_today(self)),
-            ('state', '=', 'warning'),
-            ('active', '=', True)
-        ])
+        self.flush_model(['certificate_expiry_date', 'days_to_expire', 'state', 'active', 'company_id'])
+        for company in self.env['res.company'].sudo().search([]):
+            today = fields.Date.context_today(self.with_context(tz=company.partner_id.tz or self.env.user.tz))
+            self.env.cr.execute("""
+                UPDATE product_lot_quality
+                   SET days_to_expire = refreshed.days_to_expire,
+                       state = refreshed.state
+                  FROM (
+                        SELECT id,
+                               COALESCE(certificate_expiry_date - %(today)s, 0) AS days_to_expire,
+                               CASE
+                                   WHEN certificate_expiry_date IS NULL THEN 'valid'
+                                   WHEN certificate_expiry_date < %(today)s THEN 'expired'
+                                   WHEN certificate_expiry_date - %(today)s <= %(warning_days)s THEN 'warning'
+                                   ELSE 'valid'
+                               END AS state
+                          FROM product_lot_quality
+                         WHERE company_id = %(company_id)s
+                           AND active
+                       ) refreshed
+                 WHERE product_lot_quality.id = refreshed.id
+                   AND (product_lot_quality.days_to_expire IS DISTINCT FROM refreshed.days_to_expire
+                        OR product_lot_quality.state IS DISTINCT FROM refreshed.state)
+            """, {'today': today, 'warning_days': EXPIRY_WARNING_DAYS, 'company_id': company.id})
+        self.invalidate_model(['days_to_expire', 'state'])
 
-        # Buscar certificados vencidos
-        expired_certificates = self.search([
-            ('certificate_expiry_date', '<', fields.Date.context_today(self)),
-            ('state', '=', 'expired'),
-            ('active', '=', True)
-        ])
+    @api.model
+    def _cron_check_expiring_certificates(self, batch_size=1000):
+        """
+        Cron job que verifica certificados por vencer y crea actividades
+        para administradores del módulo de manufactura.
+
+        Cada llamada procesa un bloque de ``batch_size`` certificados por vencer o
+        vencidos, en orden de id. El avance y las estadísticas se guardan en la
+        ejecución en curso (``product.lot.quality.cron.run``); el cron confirma cada
+        bloque y se vuelve a disparar mientras queden certificados, por lo que tras
+        una caída o un timeout la ejecución continúa donde se quedó.
+        """
+        CronRun = self.env['product.lot.quality.cron.run']
+        run = CronRun.search([('state', '=', 'running')], order='id desc', limit=1)
+        if not run:
+            # Actualizar días para vencer y estado antes de buscar por estado
+            self._refresh_expiry_state()
+            run = CronRun.create({'start_date': fields.Datetime.now()})
 
         # Obtener usuarios con permiso de notificaciones de certificados
         notification_group = self.env.ref('peruanita_mrp.group_quality_certificate_notifications', raise_if_not_found=False)
         if not notification_group:
+            run._finish()
+            self.env['ir.cron']._notify_progress(done=0, remaining=0)
             return
 
         notifiable_users = notification_group.users
 
-        for certificate in expiring_certificates:
-            # Verificar si ya existe una actividad pendiente para este certificado
-            existing_activity = self.env['mail.activity'].search([
-                ('res_id', '=', certificate.id),
-                ('res_model_id', '=', self.env['ir.model']._get('product.lot.quality').id),
-                ('activity_type_id', '=', self.env.ref('mail.mail_activity_data_warning').id),
-                ('state', '!=', 'done')
-            ], limit=1)
-
-            if not existing_activity:
-                # Crear actividad para cada usuario con permisos de notificación
-                for user in notifiable_users:
-                    self.env['mail.activity'].create({
-                        'res_id': certificate.id,
-                        'res_model_id': self.env['ir.model']._get('product.lot.quality').id,
-                        'activity_type_id': self.env.ref('mail.mail_activity_data_warning').id,
-                        'summary': f'Certificado de calidad por vencer - Lote {certificate.name}',
-                        'note': f'El certificado de calidad del lote {certificate.name} vencerá en {certificate.days_to_expire} días (Fecha de vencimiento: {certificate.certificate_expiry_date}).',
-                        'date_deadline': certificate.certificate_expiry_date,
-                        'user_id': user.id,
-                    })
-
-        for certificate in expired_certificates:
-            # Verificar si ya existe una actividad pendiente para este certificado vencido
-            existing_activity = self.env['mail.activity'].search([
-                ('res_id', '=', certificate.id),
-                ('res_model_id', '=', self.env['ir.model']._get('product.lot.quality').id),
-                ('activity_type_id', '=', self.env.ref('mail.mail_activity_data_todo').id),
-                ('state', '!=', 'done')
-            ], limit=1)
-
-            if not existing_activity:
-                # Crear actividad urgente para cada usuario con permisos de notificación
-                for user in notifiable_users:
-                    self.env['mail.activity'].create({
-                        'res_id': certificate.id,
-                        'res_model_id': self.env['ir.model']._get('product.lot.quality').id,
-                        'activity_type_id': self.env.ref('mail.mail_activity_data_todo').id,
-                        'summary': f'URGENTE: Certificado de calidad vencido - Lote {certificate.name}',
-                        'note': f'El certificado de calidad del lote {certificate.name} para el producto {certificate.product_id.display_name} está VENCIDO desde {abs(certificate.days_to_expire)} días (Fecha de vencimiento: {certificate.certificate_expiry_date}). Se requiere acción inmediata.',
-                        'date_deadline': fields.Date.context_today(self),
-                        'user_id': user.id,
-                    })
+        # Certificados por vencer o vencidos pendientes de revisar en esta ejecución;
+        # el filtro por fecha usa el índice parcial de certificados activos
+        warning_limit = fields.Date.context_today(self) + relativedelta(days=EXPIRY_WARNING_DAYS)
+        domain = [
+            ('certificate_expiry_date', '<=', warning_limit),
+            ('state', 'in', ('warning', 'expired')),
+            ('active', '=', True),
+        ]
+        certificates = self.search(
+            domain + [('id', '>', run.last_certificate_id)], order='id', limit=batch_size
+        )
+
+        # Crear en bloque las actividades que falten para el bloque de certificados
+        activities = certificates._schedule_expiry_activities(notifiable_users)
+        notified = len(set(activities.mapped('res_id')))
+
+        run.write({
+            'last_certificate_id': certificates[-1].id if certificates else run.last_certificate_id,
+            'scanned_count': run.scanned_count + len(certificates),
+            'notified_count': run.notified_count + notified,
+            'skipped_count': run.skipped_count + len(certificates) - notified,
+        })
+
+        remaining = self.search_count(domain + [('id', '>', run.last_certificate_id)])
+        if not remaining:
+            run._finish()
+        self.env['ir.cron']._notify_progress(done=len(certificates), remaining=remaining)
+
+    def _schedule_expiry_activities(self, users):
+        """
+        Crea las actividades de vencimiento que falten para los certificados por
+        vencer (aviso) o vencidos (tarea urgente), una por usuario y certificado.
+
+        Las actividades abiertas existentes se leen con una sola consulta agrupada
+        y todas las nuevas se crean con un único ``create``.
+        """
+        certificates = self.filtered(lambda c: c.state in ('warning', 'expired'))
+        if not certificates or not users:
+            return self.env['mail.activity']
+
+        res_model_id = self.env['ir.model']._get_id(self._name)
+        activity_types = {
+            'warning': self.env.ref('mail.mail_activity_data_warning'),
+            'expired': self.env.ref('mail.mail_activity_data_todo'),
+        }
+        existing_activities = {
+            (res_id, activity_type.id)
+            for res_id, activity_type in self.env['mail.activity']._read_group(
+                [
+                    ('res_model', '=', self._name),
+                    ('res_id', 'in', certificates.ids),
+                    ('activity_type_id', 'in', [t.id for t in activity_types.values()]),
+                ],
+                ['res_id', 'activity_type_id'],
+            )
+        }
+
+        today = fields.Date.context_today(self)
+        vals_list = []
+        for certificate in certificates:
+            activity_type = activity_types[certificate.state]
+            if (certificate.id, activity_type.id) in existing_activities:
+                continue
+
+            if certificate.state == 'warning':
+                summary = f'Certificado de calidad por vencer - Lote {certificate.name}'
+                note = f'El certificado de calidad del lote {certificate.name} vencerá en {certificate.days_to_expire} días (Fecha de vencimiento: {certificate.certificate_expiry_date}).'
+                date_deadline = certificate.certificate_expiry_date
+            else:
+                summary = f'URGENTE: Certificado de calidad vencido - Lote {certificate.name}'
+                note = f'El certificado de calidad del lote {certificate.name} para el producto {certificate.product_id.display_name} está VENCIDO desde {abs(certificate.days_to_expire)} días (Fecha de vencimiento: {certificate.certificate_expiry_date}). Se requiere acción inmediata.'
+                date_deadline = today
+
+            vals_list += [{
+                'res_id': certificate.id,
+                'res_model_id': res_model_id,
+                'activity_type_id': activity_type.id,
+                'summary': summary,
+                'note': note,
+                'date_deadline': date_deadline,
+                'user_id': user.id,
+            } for user in users]
+
+        return self.env['mail.activity'].create(vals_list)
 
     @api.model_create_multi
     def create(self, vals_list):
         """Override create para crear actividad inicial si el certificado está por vencer"""
         records = super(ProductLotQuality, self).create(vals_list)
+        self.env.cr.cache.pop(LOT_CERTIFICATE_CACHE_KEY, None)
         records._check_and_create_activities()
         return records
 
     def write(self, vals):
         """Override write para actualizar actividades si cambia la fecha de vencimiento"""
         result = super(ProductLotQuality, self).write(vals)
+        self.env.cr.cache.pop(LOT_CERTIFICATE_CACHE_KEY, None)
         if 'certificate_expiry_date' in vals or 'certificate_issue_date' in vals:
             self._check_and_create_activities()
         return result
 
+    def unlink(self):
+        """Vacía la caché de vencimientos por lote"""
+        self.env.cr.cache.pop(LOT_CERTIFICATE_CACHE_KEY, None)
+        return super(ProductLotQuality, self).unlink()
+
+    @api.model
+    def _get_lot_certificate_expiry_dates(self, lot_company_pairs):
+        """
+        Devuelve {(lote, compañía): fecha de vencimiento} del certificado vigente.
+
+        Se usa el certificado activo; si el lote solo tiene certificados archivados
+        (retención de vencidos), se usa el último vencimiento, de modo que el lote
+        sigue figurando como vencido. Los resultados se guardan en una caché por
+        transacción; solo los pares que no están en caché se consultan, todos juntos
+        en una única consulta. Los lotes sin certificado quedan con ``None``.
+        """
+        cache = self.env.cr.cache.setdefault(LOT_CERTIFICATE_CACHE_KEY, {})
+        missing = {pair for pair in lot_company_pairs if pair not in cache}
+        if missing:
+            self.flush_model(['lot_id', 'company_id', 'certificate_expiry_date', 'active'])
+            self.env.cr.execute("""
+                SELECT DISTINCT ON (lot_id, company_id) lot_id, company_id, certificate_expiry_date
+                  FROM product_lot_quality
+                 WHERE (lot_id, company_id) IN %s
+              ORDER BY lot_id, company_id, active DESC, certificate_expiry_date DESC NULLS LAST
+            """, (tuple(missing),))
+            cache.update(dict.fromkeys(missing))
+            for lot_id, company_id, expiry_date in self.env.cr.fetchall():
+                cache[(lot_id, company_id)] = expiry_date
+        return {pair: cache[pair] for pair in lot_company_pairs}
+
     def _check_and_create_activities(self):
-        """Método auxiliar para verificar y crear actividades si es necesario"""
+        """
+        Método auxiliar para verificar y crear actividades si es necesario.
+
+        Con la clave de contexto ``defer_certificate_activities`` (o durante una
+        importación) no se crean actividades: el cron diario las creará.
+        """
+        if self.env.context.get('defer_certificate_activities') or self.env.context.get('import_file'):
+            return
+
         # Obtener usuarios con permiso de notificaciones de certificados
         notification_group = self.env.ref('peruanita_mrp.group_quality_certificate_notifications', raise_if_not_found=False)
         if not notification_group:
@@ -237,31 +374,77 @@ class ProductLotQuality(models.Model):
         if not notifiable_users:
             return
 
-        for record in self:
-            if record.state in ['warning', 'expired']:
-                # Verificar si ya existe una actividad pendiente
-                existing_activity = self.env['mail.activity'].search([
-                    ('res_id', '=', record.id),
-                    ('res_model_id', '=', self.env['ir.model']._get('product.lot.quality').id),
-                    ('state', '!=', 'done')
-                ], limit=1)
-
-                if not existing_activity:
-                    activity_type = self.env.ref('mail.mail_activity_data_todo') if record.state == 'expired' else self.env.ref('mail.mail_activity_data_warning')
-
-                    for user in notifiable_users:
-                        summary = f'{"URGENTE: Certificado vencido" if record.state == "expired" else "Certificado por vencer"} - Lote {record.name}'
-                        note = f'El certificado de calidad del lote {record.name} para el producto {record.product_id.display_name} {"está VENCIDO" if record.state == "expired" else "está por vencer"} (Vencimiento: {record.certificate_expiry_date}).'
-
-                        self.env['mail.activity'].create({
-                            'res_id': record.id,
-                            'res_model_id': self.env['ir.model']._get('product.lot.quality').id,
-                            'activity_type_id': activity_type.id,
-                            'summary': summary,
-                            'note': note,
-                            'date_deadline': record.certificate_expiry_date if record.state == 'warning' else fields.Date.context_today(self),
-                            'user_id': user.id,
-                        })
+        self._schedule_expiry_activities(notifiable_users)
+
+    @api.model
+    def _cron_archive_expired_certificates(self, batch_size=1000):
+        """
+        Cron que aplica la política de retención de cada compañía: archiva los
+        certificados vencidos hace más de ``certificate_retention_days`` días y,
+        si la compañía lo indica, crea en bloque los borradores de renovación.
+
+        Cada llamada procesa hasta ``batch_size`` certificados; el cron confirma el
+        bloque y se vuelve a disparar mientras queden certificados por archivar.
+        """
+        companies = self.env['res.company'].sudo().search([('certificate_retention_days', '>', 0)])
+        domain = self._get_retention_domain(companies)
+        if not domain:
+            self.env['ir.cron']._notify_progress(done=0, remaining=0)
+            return
+
+        certificates = self.search(domain, order='certificate_expiry_date, id', limit=batch_size)
+        renew = certificates.filtered(lambda c: c.company_id.certificate_create_renewal)
+        certificates.action_archive()
+        if renew:
+            # La restricción de un certificado activo por lote se verifica en la
+            # base de datos: el archivado debe escribirse antes de crear la renovación
+            certificates.flush_recordset(['active'])
+            self.with_context(defer_certificate_activities=True).create([
+                certificate._prepare_renewal_vals() for certificate in renew
+            ])
+
+        remaining = self.search_count(domain)
+        self.env['ir.cron']._notify_progress(done=len(certificates), remaining=remaining)
+
+    @api.model
+    def _get_retention_domain(self, companies):
+        """Dominio de los certificados activos que superaron la retención de su compañía"""
+        domains = []
+        for company in companies:
+            today = fields.Date.context_today(self.with_context(tz=company.partner_id.tz or self.env.user.tz))
+            domains.append([
+                ('company_id', '=', company.id),
+                ('certificate_expiry_date', '<', today - relativedelta(days=company.certificate_retention_days)),
+            ])
+        if not domains:
+            return []
+        return expression.AND([
+            [('active', '=', True), ('renewal_draft', '=', False)],
+            expression.OR(domains),
+        ])
+
+    def _prepare_renewal_vals(self):
+        """Valores del borrador de renovación, con las fechas del certificado vencido"""
+        self.ensure_one()
+        return {
+            'product_id': self.product_id.id,
+            'lot_id': self.lot_id.id,
+            'company_id': self.company_id.id,
+            'certificate_issue_date': self.certificate_issue_date,
+            'certificate_expiry_date': self.certificate_expiry_date,
+            'renewal_draft': True,
+            'renewed_from_id': self.id,
+        }
+
+    def action_confirm_renewal(self):
+        """Confirma el borrador de renovación con la emisión de hoy"""
+        for certificate in self:
+            if not certificate.certificate_number:
+                raise UserError(f'Ingrese el número del nuevo certificado del lote {certificate.name} antes de confirmar la renovación.')
+        self.write({
+            'renewal_draft': False,
+            'certificate_issue_date': fields.Date.context_today(self),
+        })
 
     def action_renew_certificate(self):
         """Acción para renovar el certificado (crear uno nuevo)"""
@@ -279,6 +462,65 @@ class ProductLotQuality(models.Model):
         }
 
     _sql_constraints = [
-        ('lot_unique', 'unique(lot_id, company_id)',
-         'Ya existe un certificado de calidad para este lote en esta compañía!'),
+        ('lot_unique', 'EXCLUDE USING btree (lot_id WITH =, company_id WITH =) WHERE (active)',
+         'Ya existe un certificado de calidad activo para este lote en esta compañía!'),
     ]
+
+    def init(self):
+        """Índice parcial para que el escaneo diario solo recorra los certificados activos"""
+        tools.create_index(
+            self.env.cr, 'product_lot_quality_active_expiry_index',
+            self._table, ['certificate_expiry_date'], where='active'
+        )
+
+
+class ProductLotQualityCronRun(models.Model):
+    """Estadísticas y avance de cada ejecución del cron de certificados"""
+    _name = 'product.lot.quality.cron.run'
+    _description = 'Ejecución del Cron de Certificados de Calidad'
+    _order = 'start_date desc, id desc'
+
+    start_date = fields.Datetime(string='Inicio', required=True, readonly=True)
+
+    end_date = fields.Datetime(string='Fin', readonly=True)
+
+    duration = fields.Float(
+        string='Duración (s)',
+        readonly=True,
+        help='Duración total de la ejecución en segundos'
+    )
+
+    state = fields.Selection([
+        ('running', 'En Curso'),
+        ('done', 'Terminado')
+    ], string='Estado', required=True, default='running', readonly=True)
+
+    last_certificate_id = fields.Integer(
+        string='Último Certificado Procesado',
+        readonly=True,
+        help='Id del último certificado procesado; la ejecución se reanuda desde aquí'
+    )
+
+    scanned_count = fields.Integer(string='Revisados', readonly=True)
+
+    notified_count = fields.Integer(
+        string='Notificados',
+        readonly=True,
+        help='Certificados para los que se crearon actividades'
+    )
+
+    skipped_count = fields.Integer(
+        string='Omitidos',
+        readonly=True,
+        help='Certificados que ya tenían una actividad abierta'
+    )
+
+    def _finish(self):
+        """Marca la ejecución como terminada y registra su duración"""
+        end_date = fields.Datetime.now()
+        for run in self:
+            run.write({
+                'state': 'done',
+                'end_date': end_date,
+                'duration': (end_date - run.start_date).total_seconds(),
+            })
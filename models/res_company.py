@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields
+
+
+class ResCompany(models.Model):
+    _inherit = 'res.company'
+
+    lot_certificate_policy = fields.Selection([
+        ('none', 'Sin Control'),
+        ('warning', 'Advertir'),
+        ('block', 'Bloquear')
+    ], string='Control de Certificados de Lote', default='none', required=True,
+        help='Qué hacer al consumir en fabricación o entregar lotes con certificado de calidad vencido')
+
+    certificate_retention_days = fields.Integer(
+        string='Retención de Certificados Vencidos (días)',
+        default=0,
+        help='Días después del vencimiento en que se archivan los certificados de calidad. 0 = no archivar'
+    )
+
+    certificate_create_renewal = fields.Boolean(
+        string='Crear Borradores de Renovación',
+        help='Al archivar un certificado vencido, crear un borrador de renovación para el mismo lote'
+    )
+
+
+class ResConfigSettings(models.TransientModel):
+    _inherit = 'res.config.settings'
+
+    lot_certificate_policy = fields.Selection(
+        related='company_id.lot_certificate_policy',
+        readonly=False
+    )
+
+    certificate_retention_days = fields.Integer(
+        related='company_id.certificate_retention_days',
+        readonly=False
+    )
+
+    certificate_create_renewal = fields.Boolean(
+        related='company_id.certificate_create_renewal',
+        readonly=False
+    )
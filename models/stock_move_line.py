@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from odoo import models, fields
+from odoo.exceptions import UserError
+
+
+class StockMoveLine(models.Model):
+    _inherit = 'stock.move.line'
+
+    def _check_lot_certificates(self):
+        """
+        Verifica que los lotes de las líneas no tengan el certificado de calidad vencido.
+
+        Con la política "Bloquear" de la compañía, impide la validación. Devuelve las
+        líneas con certificado vencido bajo la política "Advertir", para avisar con
+        ``_post_lot_certificate_warnings`` una vez validado el documento. Los
+        certificados se leen con una sola consulta para todas las líneas.
+        """
+        lines = self.filtered(
+            lambda line: line.lot_id and line.company_id.lot_certificate_policy != 'none'
+        )
+        if not lines:
+            return self.browse()
+
+        expiry_dates = self.env['product.lot.quality']._get_lot_certificate_expiry_dates(
+            {(line.lot_id.id, line.company_id.id) for line in lines}
+        )
+        today = fields.Date.context_today(self)
+        expired_lines = lines.filtered(
+            lambda line: (expiry_dates.get((line.lot_id.id, line.company_id.id)) or today) < today
+        )
+        if not expired_lines:
+            return expired_lines
+
+        blocking_lines = expired_lines.filtered(
+            lambda line: line.company_id.lot_certificate_policy == 'block'
+        )
+        if blocking_lines:
+            raise UserError(
+                'No se puede validar porque los siguientes lotes tienen el certificado de calidad vencido:\n'
+                + '\n'.join(sorted({
+                    f'- {line.lot_id.name} ({line.product_id.display_name})' for line in blocking_lines
+                }))
+                + '\nRenueve los certificados o seleccione otros lotes antes de continuar.'
+            )
+        return expired_lines
+
+    def _post_lot_certificate_warnings(self):
+        """
+        Deja un aviso en cada documento terminado (orden de fabricación o traslado)
+        con los lotes de certificado vencido. Los documentos que quedaron pendientes
+        de un asistente (entrega parcial, consumo) no reciben el aviso: se publica
+        cuando el asistente vuelve a validar y el documento queda terminado.
+        """
+        lots_by_document = defaultdict(set)
+        for line in self:
+            document = line.move_id.raw_material_production_id or line.picking_id
+            if document and document.state == 'done':
+                lots_by_document[document].add(line.lot_id.name)
+        for document, lot_names in lots_by_document.items():
+            document.message_post(
+                body=f'Advertencia: se usaron lotes con certificado de calidad vencido: {", ".join(sorted(lot_names))}.'
+            )
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+
+
+class StockPicking(models.Model):
+    _inherit = 'stock.picking'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Recalcula en lote los traslados de MP de las órdenes afectadas"""
+        pickings = super().create(vals_list)
+        pickings._mark_raw_material_pickings_to_compute(pickings.group_id)
+        return pickings
+
+    def write(self, vals):
+        """Recalcula los traslados de MP si cambia el grupo o el tipo de operación"""
+        if 'group_id' not in vals and 'picking_type_id' not in vals:
+            return super().write(vals)
+        groups = self.group_id
+        result = super().write(vals)
+        self._mark_raw_material_pickings_to_compute(groups | self.group_id)
+        return result
+
+    def _mark_raw_material_pickings_to_compute(self, groups):
+        """Marca las órdenes de los grupos indicados para recalcular sus traslados de MP.
+
+        El recálculo se difiere al siguiente flush, por lo que varias creaciones
+        o escrituras en la misma transacción se procesan en un solo lote. Se marca
+        el grupo de abastecimiento como modificado para que el ORM también encole
+        los campos que dependen de los traslados (p. ej. el traslado pendiente).
+        """
+        if not groups:
+            return
+        productions = self.env['mrp.production'].search([
+            ('procurement_group_id', 'in', groups.ids)
+        ])
+        if not productions:
+            return
+        productions.modified(['procurement_group_id'])
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api
+import math
+from collections import defaultdict
+
+from odoo import models, fields, api, Command
 from odoo.exceptions import UserError
 
 
@@ -34,6 +37,7 @@ class StockPickingQualityInspection(models.Model):
         string='Proveedor',
         related='picking_id.partner_id',
         store=True,
+        index=True,
         readonly=True
     )
 
@@ -41,6 +45,7 @@ class StockPickingQualityInspection(models.Model):
         string='Fecha de Control',
         default=fields.Datetime.now,
         required=True,
+        index=True,
         tracking=True
     )
 
@@ -72,6 +77,58 @@ class StockPickingQualityInspection(models.Model):
         required=True
     )
 
+    line_ids = fields.One2many(
+        'stock.picking.quality.inspection.line',
+        'inspection_id',
+        string='Resultados por Lote'
+    )
+
+    @api.onchange('picking_id')
+    def _onchange_picking_id(self):
+        """Carga una línea por lote recibido de la recepción"""
+        self.line_ids = self._prepare_inspection_lines(self.picking_id)
+
+    @api.model
+    def _prepare_inspection_lines(self, picking):
+        """
+        Devuelve los comandos de las líneas por lote de la recepción.
+
+        Las líneas de movimiento con rastreo y los certificados existentes de sus
+        lotes se cargan con una consulta cada uno, sea cual sea la cantidad de lotes.
+        """
+        if not picking:
+            return [Command.clear()]
+        move_lines = self.env['stock.move.line'].search([
+            ('picking_id', '=', picking.id),
+            ('product_id.tracking', '!=', 'none'),
+        ], order='id')
+        certificates = {
+            certificate.lot_id.id: certificate
+            for certificate in self.env['product.lot.quality'].search([
+                ('lot_id', 'in', move_lines.lot_id.ids),
+                ('company_id', '=', picking.company_id.id),
+            ])
+        }
+        commands = [Command.clear()]
+        for move_line in move_lines:
+            certificate = certificates.get(move_line.lot_id.id, self.env['product.lot.quality'])
+            commands.append(Command.create({
+                'move_line_id': move_line.id,
+                'product_id': move_line.product_id.id,
+                'lot_id': move_line.lot_id.id,
+                'lot_name': move_line.lot_id.name or move_line.lot_name,
+                'quantity': move_line.quantity,
+                'product_uom_id': move_line.product_uom_id.id,
+                'certificate_id': certificate.id,
+                'certificate_number': certificate.certificate_number,
+            }))
+        return commands
+
+    def action_load_lines(self):
+        """Vuelve a cargar las líneas por lote desde la recepción"""
+        for inspection in self:
+            inspection.line_ids = self._prepare_inspection_lines(inspection.picking_id)
+
     @api.model_create_multi
     def create(self, vals_list):
         """Genera secuencia automática para el número de control"""
@@ -79,18 +136,11 @@ class StockPickingQualityInspection(models.Model):
             if vals.get('name', 'Nuevo') == 'Nuevo':
                 vals['name'] = self.env['ir.sequence'].next_by_code('stock.picking.quality.inspection') or 'Nuevo'
 
-            # Actualizar el picking según el estado
-            if 'picking_id' in vals and 'state' in vals:
-                picking = self.env['stock.picking'].browse(vals['picking_id'])
-                picking.quality_inspection_approved = (vals['state'] == 'approved')
-
+        # La aprobación del picking es un campo calculado almacenado: el ORM la
+        # recalcula una sola vez por transacción para todos los pickings afectados
         records = super(StockPickingQualityInspection, self).create(vals_list)
-
-        for record in records:
-            if record.state == 'approved':
-                record.message_post(body=f'Control de calidad aprobado por {record.inspector_id.name}.')
-            else:
-                record.message_post(body=f'Control de calidad desaprobado por {record.inspector_id.name}.')
+        records.line_ids._sync_lot_certificates()
+        records._log_inspection_result({record.id: record.inspector_id.name for record in records})
 
         return records
 
@@ -98,17 +148,169 @@ class StockPickingQualityInspection(models.Model):
         """Actualiza el picking cuando cambia el estado"""
         result = super(StockPickingQualityInspection, self).write(vals)
 
-        if 'state' in vals:
-            for record in self:
-                record.picking_id.quality_inspection_approved = (record.state == 'approved')
+        if 'line_ids' in vals:
+            self.line_ids._sync_lot_certificates()
 
-                if record.state == 'approved':
-                    record.message_post(body=f'Control de calidad aprobado por {self.env.user.name}.')
-                else:
-                    record.message_post(body=f'Control de calidad desaprobado por {self.env.user.name}.')
+        if 'state' in vals:
+            self._log_inspection_result(dict.fromkeys(self.ids, self.env.user.name))
 
         return result
 
+    def _log_inspection_result(self, user_names):
+        """Registra en el chatter el resultado de cada control, en un solo lote de mensajes"""
+        self._message_log_batch(bodies={
+            record.id: (
+                f'Control de calidad aprobado por {user_names[record.id]}.'
+                if record.state == 'approved'
+                else f'Control de calidad desaprobado por {user_names[record.id]}.'
+            )
+            for record in self
+        })
+
+
+class StockPickingQualityInspectionLine(models.Model):
+    """Resultado del control de calidad por línea de movimiento y lote"""
+    _name = 'stock.picking.quality.inspection.line'
+    _description = 'Resultado de Control de Calidad por Lote'
+    _order = 'inspection_id, id'
+
+    inspection_id = fields.Many2one(
+        'stock.picking.quality.inspection',
+        string='Control de Calidad',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+
+    move_line_id = fields.Many2one(
+        'stock.move.line',
+        string='Línea de Movimiento',
+        ondelete='set null'
+    )
+
+    product_id = fields.Many2one(
+        'product.product',
+        string='Producto',
+        required=True
+    )
+
+    lot_id = fields.Many2one(
+        'stock.lot',
+        string='Lote',
+        domain="[('product_id', '=', product_id)]"
+    )
+
+    lot_name = fields.Char(
+        string='Número de Lote',
+        help='Número de lote de la recepción; el lote se crea al registrar su certificado'
+    )
+
+    quantity = fields.Float(
+        string='Cantidad',
+        digits='Product Unit of Measure'
+    )
+
+    product_uom_id = fields.Many2one('uom.uom', string='Unidad de Medida')
+
+    result = fields.Selection([
+        ('approved', 'Aprobado'),
+        ('rejected', 'Desaprobado')
+    ], string='Resultado', required=True, default='approved')
+
+    findings = fields.Char(string='Hallazgos')
+
+    certificate_number = fields.Char(string='Número de Certificado')
+
+    certificate_issue_date = fields.Date(
+        string='Emisión del Certificado',
+        help='Si se indica en una línea aprobada, se crea o renueva el certificado de calidad del lote'
+    )
+
+    certificate_id = fields.Many2one(
+        'product.lot.quality',
+        string='Certificado',
+        readonly=True
+    )
+
+    company_id = fields.Many2one(
+        related='inspection_id.company_id',
+        store=True
+    )
+
+    def _sync_lot_certificates(self):
+        """
+        Crea o renueva los certificados de calidad de los lotes aprobados que
+        indican fecha de emisión, en la misma transacción que el control.
+
+        Los lotes pendientes de la recepción se crean en bloque, los certificados
+        existentes se leen con una sola búsqueda, se actualizan con una escritura
+        por grupo de valores iguales y los nuevos se crean con un único ``create``.
+        Las actividades de vencimiento se programan una sola vez al final.
+
+        Quien puede modificar el control de calidad registra los certificados de
+        sus lotes aunque no tenga acceso a los certificados: tras verificar el
+        acceso al control, los certificados se escriben como superusuario.
+        """
+        lines = self.filtered(lambda line: line.result == 'approved' and line.certificate_issue_date)
+        if not lines:
+            return
+        lines.inspection_id.check_access('write')
+
+        # Crear los lotes indicados por número en las líneas de movimiento
+        lines.move_line_id.filtered(
+            lambda move_line: not move_line.lot_id and move_line.lot_name
+        )._create_and_assign_production_lot()
+        for line in lines.filtered(lambda line: not line.lot_id and line.move_line_id.lot_id):
+            line.lot_id = line.move_line_id.lot_id
+        lines = lines.filtered('lot_id')
+        if not lines:
+            return
+
+        Certificate = self.env['product.lot.quality'].sudo().with_context(defer_certificate_activities=True)
+        existing = {
+            (certificate.lot_id.id, certificate.company_id.id): certificate
+            for certificate in Certificate.search([
+                ('lot_id', 'in', lines.lot_id.ids),
+                ('company_id', 'in', lines.company_id.ids),
+            ])
+        }
+
+        lines_by_key = defaultdict(lambda: self.env['stock.picking.quality.inspection.line'])
+        for line in lines:
+            lines_by_key[(line.lot_id.id, line.company_id.id)] |= line
+
+        to_create = []
+        to_write = defaultdict(lambda: Certificate)
+        for key, key_lines in lines_by_key.items():
+            line = key_lines[-1]
+            vals = {
+                'certificate_issue_date': line.certificate_issue_date,
+                'renewal_draft': False,
+            }
+            if line.certificate_number:
+                vals['certificate_number'] = line.certificate_number
+            certificate = existing.get(key)
+            if certificate:
+                to_write[tuple(sorted(vals.items()))] |= certificate
+                key_lines.certificate_id = certificate.id
+            else:
+                to_create.append((key_lines, dict(
+                    vals, lot_id=line.lot_id.id, product_id=line.product_id.id, company_id=line.company_id.id
+                )))
+
+        certificates = Certificate
+        for vals_items, group_certificates in to_write.items():
+            group_certificates.write(dict(vals_items))
+            certificates |= group_certificates
+
+        if to_create:
+            created = Certificate.create([vals for _key_lines, vals in to_create])
+            for (key_lines, _vals), certificate in zip(to_create, created):
+                key_lines.certificate_id = certificate.id
+            certificates |= created
+
+        certificates.with_context(defer_certificate_activities=False)._check_and_create_activities()
+
 
 class StockPicking(models.Model):
     """Extensión de Stock Picking para Control de Calidad"""
@@ -122,28 +324,90 @@ class StockPicking(models.Model):
 
     quality_inspection_count = fields.Integer(
         string='Controles de Calidad',
-        compute='_compute_quality_inspection_count'
+        compute='_compute_quality_inspection_stats',
+        store=True
     )
 
     quality_inspection_approved = fields.Boolean(
         string='Control de Calidad Aprobado',
-        compute='_compute_quality_inspection_approved',
+        compute='_compute_quality_inspection_stats',
         store=True,
         help='Indica si el control de calidad ha sido aprobado'
     )
 
-    @api.depends('quality_inspection_ids')
-    def _compute_quality_inspection_count(self):
-        """Cuenta los controles de calidad"""
-        for picking in self:
-            picking.quality_inspection_count = len(picking.quality_inspection_ids)
+    quality_inspection_rejected = fields.Boolean(
+        string='Con Control Desaprobado',
+        compute='_compute_quality_inspection_stats',
+        store=True,
+        help='Indica si la recepción tiene algún control de calidad desaprobado'
+    )
+
+    quality_inspection_required = fields.Boolean(
+        string='Requiere Control de Calidad',
+        compute='_compute_quality_sampling',
+        help='Según los planes de muestreo y el historial del proveedor, la recepción requiere '
+             'un control de calidad aprobado para validarse'
+    )
 
-    @api.depends('quality_inspection_ids', 'quality_inspection_ids.state')
-    def _compute_quality_inspection_approved(self):
-        """Determina si hay un control de calidad aprobado"""
+    quality_sample_size = fields.Integer(
+        string='Tamaño de Muestra',
+        compute='_compute_quality_sampling',
+        help='Unidades a inspeccionar según los planes de muestreo (AQL). '
+             'Los productos sin plan se inspeccionan completos'
+    )
+
+    @api.depends('quality_inspection_ids.state')
+    def _compute_quality_inspection_stats(self):
+        """
+        Cuenta los controles de calidad y determina si hay alguno aprobado o
+        desaprobado, con una sola consulta agrupada para todos los pickings.
+        """
+        counts = defaultdict(dict)
+        if self.ids:
+            for picking, state, count in self.env['stock.picking.quality.inspection']._read_group(
+                [('picking_id', 'in', self.ids)],
+                ['picking_id', 'state'],
+                ['__count'],
+            ):
+                counts[picking.id][state] = count
         for picking in self:
-            approved = picking.quality_inspection_ids.filtered(lambda i: i.state == 'approved')
-            picking.quality_inspection_approved = bool(approved)
+            picking_counts = counts[picking._origin.id]
+            picking.quality_inspection_count = sum(picking_counts.values())
+            picking.quality_inspection_approved = bool(picking_counts.get('approved'))
+            picking.quality_inspection_rejected = bool(picking_counts.get('rejected'))
+
+    @api.depends('picking_type_code', 'partner_id', 'company_id', 'move_ids.product_id', 'move_ids.product_qty')
+    def _compute_quality_sampling(self):
+        """
+        Decide por recepción si requiere control de calidad y el tamaño de muestra.
+
+        Cada producto usa el plan de muestreo más específico; sin plan se inspecciona
+        completo. Si el plan permite omitir lotes y el proveedor califica por su
+        historial, el producto no requiere control. El historial de todos los
+        proveedores se obtiene con una única consulta agrupada.
+        """
+        receptions = self.filtered(lambda p: p.picking_type_code == 'incoming')
+        (self - receptions).update({'quality_inspection_required': False, 'quality_sample_size': 0})
+        if not receptions:
+            return
+
+        Plan = self.env['stock.picking.quality.sampling.plan']
+        plans = Plan.search([('company_id', 'in', receptions.company_id.ids + [False])])
+        history = plans._get_supplier_history(receptions.partner_id)
+
+        for picking in receptions:
+            required = not picking.move_ids
+            sample_size = 0
+            for move in picking.move_ids:
+                plan = plans._get_applicable_plan(picking.partner_id, move.product_id, picking.company_id)
+                if not plan:
+                    required = True
+                    sample_size += math.ceil(move.product_qty)
+                elif not plan._is_skip_lot_qualified(history.get(picking.partner_id, [])):
+                    required = True
+                    sample_size += plan._get_sample_size(move.product_qty)
+            picking.quality_inspection_required = required
+            picking.quality_sample_size = sample_size
 
     def action_quality_control(self):
         """Abre el wizard de control de calidad"""
@@ -184,15 +448,69 @@ class StockPicking(models.Model):
 
         return action
 
+    def action_quality_control_multi(self):
+        """Abre el wizard de control de calidad para varias recepciones"""
+        receptions = self.filtered(lambda p: p.picking_type_code == 'incoming')
+        if not receptions:
+            raise UserError('Solo las recepciones requieren control de calidad.')
+
+        return {
+            'name': 'Control de Calidad de Recepciones',
+            'type': 'ir.actions.act_window',
+            'res_model': 'stock.picking.quality.multi.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_picking_ids': receptions.ids},
+        }
+
     def button_validate(self):
-        """Override para validar control de calidad antes de validar recepción"""
-        for picking in self:
-            # Solo verificar para recepciones
-            if picking.picking_type_code == 'incoming':
-                if not picking.quality_inspection_approved:
-                    raise UserError(
-                        'No se puede validar esta recepción sin un control de calidad aprobado.\n'
-                        'Por favor, realice el control de calidad y apruébelo antes de continuar.'
-                    )
-
-        return super(StockPicking, self).button_validate()
+        """
+        Override para validar control de calidad antes de validar recepción.
+
+        Las recepciones que requieren control según los planes de muestreo, o que
+        tienen un control rechazado, y no tienen uno aprobado se reúnen en un solo
+        error. Con la
+        clave de contexto ``skip_unapproved_receptions`` se validan solo las
+        aprobadas y se devuelve una notificación con las omitidas, seguida del
+        resultado de la validación (p. ej. el asistente de entregas parciales).
+        """
+        self.fetch(['picking_type_id', 'quality_inspection_approved', 'quality_inspection_rejected'])
+        unapproved = self.filtered(
+            lambda p: p.picking_type_code == 'incoming'
+            and not p.quality_inspection_approved
+            and (p.quality_inspection_rejected or p.quality_inspection_required)
+        )
+        if unapproved:
+            if not self.env.context.get('skip_unapproved_receptions'):
+                raise UserError(
+                    'No se pueden validar las siguientes recepciones sin un control de calidad aprobado:\n'
+                    + '\n'.join(f'- {name}' for name in unapproved.mapped('name'))
+                    + '\nPor favor, realice el control de calidad y apruébelo antes de continuar, '
+                      'o use la acción "Validar Recepciones Aprobadas" para validar solo las aprobadas.'
+                )
+            if unapproved == self:
+                raise UserError('Ninguna de las recepciones seleccionadas tiene un control de calidad aprobado.')
+            result = (self - unapproved).button_validate()
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': 'Recepciones omitidas',
+                    'message': 'No se validaron por no tener un control de calidad aprobado: '
+                               + ', '.join(unapproved.mapped('name')),
+                    'type': 'warning',
+                    'sticky': True,
+                    'next': result if isinstance(result, dict) else {
+                        'type': 'ir.actions.client',
+                        'tag': 'soft_reload',
+                    },
+                },
+            }
+
+        # Verificar los certificados de calidad de los lotes entregados
+        deliveries = self.filtered(lambda p: p.picking_type_code == 'outgoing')
+        expired_lines = deliveries.move_ids.move_line_ids._check_lot_certificates()
+
+        result = super(StockPicking, self).button_validate()
+        expired_lines._post_lot_certificate_warnings()
+        return result
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, tools
+from odoo.tools import SQL
+
+
+class StockPickingQualityReport(models.Model):
+    """Indicadores de calidad por proveedor, categoría de producto y mes"""
+    _name = 'stock.picking.quality.report'
+    _description = 'Indicadores de Calidad de Proveedores'
+    _auto = False
+    _order = 'month desc, partner_id'
+
+    partner_id = fields.Many2one('res.partner', string='Proveedor', readonly=True)
+
+    categ_id = fields.Many2one(
+        'product.category',
+        string='Categoría de Producto',
+        readonly=True,
+        help='Categoría principal de la recepción: la de los productos con mayor cantidad recibida'
+    )
+
+    company_id = fields.Many2one('res.company', string='Compañía', readonly=True)
+
+    month = fields.Date(string='Mes', readonly=True)
+
+    inspection_count = fields.Integer(string='# Controles', readonly=True)
+
+    approved_count = fields.Integer(string='# Aprobados', readonly=True)
+
+    rejected_count = fields.Integer(string='# Desaprobados', readonly=True)
+
+    approval_rate = fields.Float(
+        string='Tasa de Aprobación (%)',
+        readonly=True,
+        aggregator='avg'
+    )
+
+    inspection_delay = fields.Float(
+        string='Horas hasta el Control',
+        readonly=True,
+        aggregator='avg',
+        help='Horas promedio entre la fecha programada de la recepción y el control de calidad'
+    )
+
+    def _read_group_select(self, aggregate_spec, query):
+        """
+        La tasa de aprobación y las horas hasta el control se calculan a partir de
+        los totales de cada grupo, no como promedio de las filas.
+        """
+        if aggregate_spec not in ('approval_rate:avg', 'inspection_delay:avg'):
+            return super()._read_group_select(aggregate_spec, query)
+        inspection_count = self._field_to_sql(self._table, 'inspection_count', query)
+        if aggregate_spec == 'approval_rate:avg':
+            return SQL(
+                '100.0 * SUM(%s) / NULLIF(SUM(%s), 0)',
+                self._field_to_sql(self._table, 'approved_count', query),
+                inspection_count,
+            )
+        return SQL(
+            'SUM(%s * %s) / NULLIF(SUM(%s), 0)',
+            self._field_to_sql(self._table, 'inspection_delay', query),
+            inspection_count,
+            inspection_count,
+        )
+
+    def init(self):
+        """
+        Vista agregada de los controles de calidad. Cada control cuenta una sola
+        vez, en la categoría principal de su recepción, para que los totales por
+        proveedor o mes no se dupliquen.
+        """
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(f"""
+            CREATE OR REPLACE VIEW {self._table} AS (
+                SELECT row_number() OVER (ORDER BY month, partner_id, categ_id, company_id) AS id,
+                       partner_id, categ_id, company_id, month,
+                       inspection_count, approved_count, rejected_count,
+                       approval_rate, inspection_delay
+                  FROM (
+                        SELECT i.partner_id,
+                               category.categ_id,
+                               i.company_id,
+                               date_trunc('month', i.inspection_date)::date AS month,
+                               count(*) AS inspection_count,
+                               count(*) FILTER (WHERE i.state = 'approved') AS approved_count,
+                               count(*) FILTER (WHERE i.state = 'rejected') AS rejected_count,
+                               100.0 * count(*) FILTER (WHERE i.state = 'approved') / count(*) AS approval_rate,
+                               avg(GREATEST(EXTRACT(EPOCH FROM i.inspection_date - p.scheduled_date), 0) / 3600.0)
+                                   AS inspection_delay
+                          FROM stock_picking_quality_inspection i
+                          JOIN stock_picking p ON p.id = i.picking_id
+                     LEFT JOIN LATERAL (
+                               SELECT pt.categ_id
+                                 FROM stock_move sm
+                                 JOIN product_product pp ON pp.id = sm.product_id
+                                 JOIN product_template pt ON pt.id = pp.product_tmpl_id
+                                WHERE sm.picking_id = p.id
+                             GROUP BY pt.categ_id
+                             ORDER BY SUM(sm.product_qty) DESC, pt.categ_id
+                                LIMIT 1
+                               ) category ON TRUE
+                      GROUP BY i.partner_id, category.categ_id, i.company_id,
+                               date_trunc('month', i.inspection_date)::date
+                       ) kpi
+            )
+        """)
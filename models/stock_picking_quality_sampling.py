@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import math
+from collections import defaultdict
+
+from odoo import models, fields
+from dateutil.relativedelta import relativedelta
+
+# Letra código del tamaño de muestra según el tamaño del lote y el nivel de
+# inspección general (ISO 2859-1, tabla 1): (tamaño máximo del lote, I, II, III)
+AQL_CODE_LETTERS = [
+    (8, 'A', 'A', 'B'),
+    (15, 'A', 'B', 'C'),
+    (25, 'B', 'C', 'D'),
+    (50, 'C', 'D', 'E'),
+    (90, 'C', 'E', 'F'),
+    (150, 'D', 'F', 'G'),
+    (280, 'E', 'G', 'H'),
+    (500, 'F', 'H', 'J'),
+    (1200, 'G', 'J', 'K'),
+    (3200, 'H', 'K', 'L'),
+    (10000, 'J', 'L', 'M'),
+    (35000, 'K', 'M', 'N'),
+    (150000, 'L', 'N', 'P'),
+    (500000, 'M', 'P', 'Q'),
+    (math.inf, 'N', 'Q', 'R'),
+]
+
+# Tamaño de muestra por letra código (ISO 2859-1, tabla 2-A)
+AQL_SAMPLE_SIZES = {
+    'A': 2, 'B': 3, 'C': 5, 'D': 8, 'E': 13, 'F': 20, 'G': 32, 'H': 50,
+    'J': 80, 'K': 125, 'L': 200, 'M': 315, 'N': 500, 'P': 800, 'Q': 1250, 'R': 2000,
+}
+
+
+class StockPickingQualitySamplingPlan(models.Model):
+    """Plan de muestreo (AQL) y reglas de omisión de lotes para recepciones"""
+    _name = 'stock.picking.quality.sampling.plan'
+    _description = 'Plan de Muestreo de Control de Calidad'
+    _order = 'sequence, id'
+
+    name = fields.Char(string='Nombre', required=True)
+
+    sequence = fields.Integer(string='Secuencia', default=10)
+
+    partner_id = fields.Many2one(
+        'res.partner',
+        string='Proveedor',
+        help='Dejar vacío para aplicar el plan a todos los proveedores'
+    )
+
+    product_id = fields.Many2one(
+        'product.product',
+        string='Producto',
+        help='Dejar vacío para aplicar el plan a todos los productos. '
+             'El plan más específico (producto y proveedor) tiene prioridad'
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Compañía',
+        default=lambda self: self.env.company
+    )
+
+    inspection_level = fields.Selection([
+        ('1', 'I - Reducido'),
+        ('2', 'II - Normal'),
+        ('3', 'III - Riguroso')
+    ], string='Nivel de Inspección', required=True, default='2',
+        help='Nivel de inspección general (ISO 2859-1) usado para el tamaño de muestra')
+
+    skip_lot = fields.Boolean(
+        string='Omitir Lotes (Skip-Lot)',
+        help='Las recepciones de proveedores con buen historial no requieren control de calidad'
+    )
+
+    skip_lot_window_days = fields.Integer(
+        string='Historial (días)',
+        default=180,
+        help='Días de historial de controles del proveedor que se evalúan'
+    )
+
+    skip_lot_min_inspections = fields.Integer(
+        string='Controles Mínimos',
+        default=10,
+        help='Cantidad mínima de controles en el historial para omitir el control'
+    )
+
+    skip_lot_min_approval_rate = fields.Float(
+        string='Aprobación Mínima (%)',
+        default=100.0,
+        help='Porcentaje mínimo de controles aprobados en el historial para omitir el control'
+    )
+
+    active = fields.Boolean(string='Activo', default=True)
+
+    def _get_sample_size(self, lot_size):
+        """Tamaño de muestra AQL para la cantidad recibida, sin superar el lote"""
+        self.ensure_one()
+        lot_size = math.ceil(lot_size)
+        if lot_size <= 0:
+            return 0
+        level = int(self.inspection_level)
+        letter = next(row[level] for row in AQL_CODE_LETTERS if lot_size <= row[0])
+        return min(AQL_SAMPLE_SIZES[letter], lot_size)
+
+    def _get_applicable_plan(self, partner, product, company):
+        """Devuelve el plan más específico de ``self`` para el proveedor, producto y compañía"""
+        candidates = self.filtered(lambda plan: (
+            plan.partner_id in (partner, self.env['res.partner'])
+            and plan.product_id in (product, self.env['product.product'])
+            and plan.company_id in (company, self.env['res.company'])
+        ))
+        if not candidates:
+            return candidates
+        return max(candidates, key=lambda plan: (
+            bool(plan.product_id), bool(plan.partner_id), bool(plan.company_id), -plan.sequence, -plan.id
+        ))
+
+    def _is_skip_lot_qualified(self, history):
+        """
+        Indica si el proveedor califica para omitir el control según el plan.
+
+        ``history`` es la lista [(día, estado, cantidad)] de controles del proveedor
+        devuelta por ``_get_supplier_history``.
+        """
+        self.ensure_one()
+        if not self.skip_lot:
+            return False
+        date_from = fields.Date.context_today(self) - relativedelta(days=self.skip_lot_window_days)
+        approved = total = 0
+        for day, state, count in history:
+            if day >= date_from:
+                total += count
+                approved += count if state == 'approved' else 0
+        return (
+            total > 0
+            and total >= self.skip_lot_min_inspections
+            and approved * 100.0 / total >= self.skip_lot_min_approval_rate
+        )
+
+    def _get_supplier_history(self, partners):
+        """
+        Devuelve {proveedor: [(día, estado, cantidad)]} de los controles de los
+        proveedores, dentro de la ventana más amplia de los planes, con una única
+        consulta agrupada.
+        """
+        plans = self.filtered('skip_lot')
+        if not plans or not partners:
+            return {}
+        date_from = fields.Date.context_today(self) - relativedelta(
+            days=max(plans.mapped('skip_lot_window_days'))
+        )
+        history = defaultdict(list)
+        for partner, state, day, count in self.env['stock.picking.quality.inspection']._read_group(
+            [('partner_id', 'in', partners.ids), ('inspection_date', '>=', date_from)],
+            ['partner_id', 'state', 'inspection_date:day'],
+            ['__count'],
+        ):
+            history[partner].append((fields.Date.to_date(day), state, count))
+        return history
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+from odoo import models, fields, api
+from odoo.osv import expression
+
+
+class StockLot(models.Model):
+    _inherit = 'stock.lot'
+
+    quality_certificate_ids = fields.One2many(
+        'product.lot.quality',
+        'lot_id',
+        string='Certificados de Calidad',
+        context={'active_test': False}
+    )
+
+    certificate_expiry_date = fields.Date(
+        string='Vencimiento del Certificado',
+        compute='_compute_certificate_expiry_date',
+        store=True,
+        index=True,
+        help='Fecha de vencimiento más próxima entre los certificados de calidad activos del lote. '
+             'Si solo tiene certificados archivados, el último vencimiento'
+    )
+
+    @api.depends('quality_certificate_ids.certificate_expiry_date', 'quality_certificate_ids.active')
+    def _compute_certificate_expiry_date(self):
+        """
+        Toma el vencimiento más próximo de los certificados activos del lote; sin
+        certificado activo, el último vencimiento de los archivados, para que el
+        lote siga excluido tras archivar su certificado vencido.
+        """
+        for lot in self:
+            active_dates = lot.quality_certificate_ids.filtered('active').mapped('certificate_expiry_date')
+            archived_dates = lot.quality_certificate_ids.filtered(lambda c: not c.active).mapped('certificate_expiry_date')
+            if active_dates:
+                lot.certificate_expiry_date = min(active_dates)
+            else:
+                lot.certificate_expiry_date = max(archived_dates) if archived_dates else False
+
+
+class StockQuant(models.Model):
+    _inherit = 'stock.quant'
+
+    certificate_expiry_date = fields.Date(
+        string='Vencimiento del Certificado',
+        related='lot_id.certificate_expiry_date',
+        store=True,
+        index=True
+    )
+
+    @api.model
+    def _get_removal_strategy_domain_order(self, domain, removal_strategy, qty):
+        """
+        Estrategia "certificate_fefo": reserva primero los lotes cuyo certificado de
+        calidad vence antes y excluye los lotes con certificado vencido. Los lotes
+        sin certificado quedan al final.
+        """
+        if removal_strategy == 'certificate_fefo':
+            domain = expression.AND([domain, [
+                '|',
+                ('certificate_expiry_date', '=', False),
+                ('certificate_expiry_date', '>=', fields.Date.context_today(self)),
+            ]])
+            return domain, 'certificate_expiry_date, in_date, id'
+        return super()._get_removal_strategy_domain_order(domain, removal_strategy, qty)
+
+    @api.model
+    def _get_removal_strategy_sort_key(self, removal_strategy):
+        """Orden en memoria (caché de quants) equivalente al de ``_get_removal_strategy_domain_order``"""
+        if removal_strategy == 'certificate_fefo':
+            return lambda q: (q.certificate_expiry_date or date.max, q.in_date, q.id), False
+        return super()._get_removal_strategy_sort_key(removal_strategy)
+
+    @api.model
+    def _gather(self, product_id, location_id, lot_id=None, package_id=None, owner_id=None, strict=False, qty=0):
+        """
+        Excluye los lotes con certificado vencido también cuando los quants salen
+        de la caché de la reserva, que no aplica el dominio de la estrategia.
+        """
+        quants = super()._gather(
+            product_id, location_id, lot_id=lot_id, package_id=package_id,
+            owner_id=owner_id, strict=strict, qty=qty,
+        )
+        if self._get_removal_strategy(product_id, location_id) != 'certificate_fefo':
+            return quants
+        today = fields.Date.context_today(self)
+        return quants.filtered(
+            lambda q: not q.certificate_expiry_date or q.certificate_expiry_date >= today
+        )
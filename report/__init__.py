@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+from . import mrp_report_bom_structure
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+
+
+class ReportBomStructure(models.AbstractModel):
+    _inherit = 'report.mrp.report_bom_structure'
+
+    @api.model
+    def _get_bom_data(self, bom, warehouse, product=False, line_qty=False, bom_line=False, level=0,
+                      parent_bom=False, parent_product=False, index=0, product_info=False,
+                      ignore_stock=False, simulated_leaves_per_workcenter=False):
+        """
+        Agrega la merma de la BOM y, para los sub-ensambles, la de su línea.
+
+        Los campos de merma de todas las líneas de la BOM se leen en una sola
+        consulta antes de armar los componentes, que luego los toman de la caché.
+        """
+        bom.bom_line_ids.fetch([
+            'product_qty', 'total_qty_with_waste', 'has_waste_override', 'waste_percentage_override',
+        ])
+        data = super()._get_bom_data(
+            bom, warehouse, product=product, line_qty=line_qty, bom_line=bom_line, level=level,
+            parent_bom=parent_bom, parent_product=parent_product, index=index,
+            product_info=product_info, ignore_stock=ignore_stock,
+            simulated_leaves_per_workcenter=simulated_leaves_per_workcenter,
+        )
+        data['waste_percentage'] = bom.waste_percentage
+        data['effective_waste_factor'] = bom.effective_waste_factor
+        if bom_line:
+            data.update(self._get_waste_data(bom_line, data.get('quantity', 0.0)))
+        return data
+
+    @api.model
+    def _get_component_data(self, parent_bom, parent_product, warehouse, bom_line, line_quantity,
+                            level, index, product_info, ignore_stock=False):
+        """Agrega la merma de la línea a los datos del componente"""
+        data = super()._get_component_data(
+            parent_bom, parent_product, warehouse, bom_line, line_quantity,
+            level, index, product_info, ignore_stock=ignore_stock,
+        )
+        data.update(self._get_waste_data(bom_line, line_quantity))
+        return data
+
+    @api.model
+    def _get_waste_data(self, bom_line, line_quantity):
+        """Porcentaje, factor y cantidad de merma de la línea para la cantidad mostrada"""
+        waste_factor = bom_line._get_waste_factors()[bom_line.id]
+        return {
+            'waste_percentage': bom_line._get_waste_percentage(),
+            'waste_factor': waste_factor,
+            'waste_qty': line_quantity * (waste_factor - 1.0),
+        }
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+from . import test_mrp_production
+from . import test_product_lot_quality
+from . import test_quality_inspection
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from odoo import Command
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestMrpProductionSaleOrder(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        route_mto = cls.env.ref('stock.route_warehouse0_mto')
+        route_mto.active = True
+        route_manufacture = cls.env.ref('mrp.route_warehouse0_manufacture')
+        cls.warehouse = cls.env['stock.warehouse'].search([('company_id', '=', cls.env.company.id)], limit=1)
+        cls.partner = cls.env['res.partner'].create({'name': 'Cliente de Prueba'})
+        cls.component = cls.env['product.product'].create({
+            'name': 'Harina de Prueba',
+            'is_storable': True,
+        })
+        cls.product = cls.env['product.product'].create({
+            'name': 'Pan de Prueba',
+            'is_storable': True,
+            'route_ids': [Command.set([route_mto.id, route_manufacture.id])],
+        })
+        cls.bom = cls.env['mrp.bom'].create({
+            'product_tmpl_id': cls.product.product_tmpl_id.id,
+            'product_qty': 1.0,
+            'bom_line_ids': [Command.create({
+                'product_id': cls.component.id,
+                'product_qty': 2.0,
+            })],
+        })
+
+    def _create_sale_order(self):
+        return self.env['sale.order'].create({
+            'partner_id': self.partner.id,
+            'warehouse_id': self.warehouse.id,
+            'order_line': [Command.create({
+                'product_id': self.product.id,
+                'product_uom_qty': 3.0,
+            })],
+        })
+
+    def test_confirm_sale_order_sets_sale_order_on_productions(self):
+        """Las órdenes de fabricación generadas al confirmar una venta la referencian"""
+        sale_order = self._create_sale_order()
+        sale_order.action_confirm()
+
+        productions = self.env['mrp.production'].search([('product_id', '=', self.product.id)])
+        self.assertTrue(productions)
+        self.assertEqual(productions.sale_order_id, sale_order)
+
+    def test_sale_order_from_move_dest(self):
+        """Sin venta en el grupo de la orden, se toma la del grupo del movimiento destino"""
+        sale_order = self._create_sale_order()
+        sale_group = self.env['procurement.group'].create({
+            'name': sale_order.name,
+            'sale_id': sale_order.id,
+        })
+        dest_move = self.env['stock.move'].create({
+            'name': self.product.name,
+            'product_id': self.product.id,
+            'product_uom_qty': 3.0,
+            'location_id': self.warehouse.lot_stock_id.id,
+            'location_dest_id': self.env.ref('stock.stock_location_customers').id,
+            'group_id': sale_group.id,
+        })
+        production_group = self.env['procurement.group'].create({'name': 'MO sin venta'})
+
+        production = self.env['mrp.production'].create({
+            'product_id': self.product.id,
+            'bom_id': self.bom.id,
+            'product_qty': 3.0,
+            'procurement_group_id': production_group.id,
+            'move_dest_ids': [Command.link(dest_move.id)],
+        })
+
+        self.assertEqual(production.sale_order_id, sale_order)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from dateutil.relativedelta import relativedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestProductLotQuality(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.product = cls.env['product.product'].create({
+            'name': 'Harina de Prueba',
+            'is_storable': True,
+            'tracking': 'lot',
+        })
+        cls.lot = cls.env['stock.lot'].create({
+            'name': 'LOTE-TEST-001',
+            'product_id': cls.product.id,
+            'company_id': cls.env.company.id,
+        })
+
+    def test_archive_expired_certificate_with_renewal(self):
+        """Archivar un certificado vencido crea su borrador de renovación"""
+        self.env.company.write({
+            'certificate_retention_days': 30,
+            'certificate_create_renewal': True,
+        })
+        issue_date = fields.Date.context_today(self.env.user) - relativedelta(years=1)
+        certificate = self.env['product.lot.quality'].create({
+            'product_id': self.product.id,
+            'lot_id': self.lot.id,
+            'certificate_issue_date': issue_date,
+        })
+
+        self.env['product.lot.quality']._cron_archive_expired_certificates(batch_size=10)
+
+        self.assertFalse(certificate.active)
+        renewal = self.env['product.lot.quality'].search([('lot_id', '=', self.lot.id)])
+        self.assertEqual(len(renewal), 1)
+        self.assertTrue(renewal.renewal_draft)
+        self.assertEqual(renewal.renewed_from_id, certificate)
+        self.assertEqual(renewal.certificate_expiry_date, certificate.certificate_expiry_date)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestQualityInspection(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.supplier = cls.env['res.partner'].create({'name': 'Proveedor de Prueba'})
+        picking_type = cls.env.ref('stock.picking_type_in')
+        cls.pickings = cls.env['stock.picking'].create([{
+            'partner_id': cls.supplier.id,
+            'picking_type_id': picking_type.id,
+            'location_id': cls.env.ref('stock.stock_location_suppliers').id,
+            'location_dest_id': picking_type.default_location_dest_id.id,
+        } for _index in range(100)])
+        cls.env.flush_all()
+
+    def test_create_inspections_query_count(self):
+        """Crear 100 controles no escribe cada recepción por separado"""
+        Inspection = self.env['stock.picking.quality.inspection'].with_context(tracking_disable=True)
+        vals_list = [{
+            'name': f'QC-TEST-{picking.id}',
+            'picking_id': picking.id,
+            'findings': 'Sin observaciones',
+            'state': 'approved',
+        } for picking in self.pickings]
+
+        with self.assertQueryCount(60):
+            Inspection.create(vals_list)
+            self.env.flush_all()
+
+        self.assertEqual(self.pickings.mapped('quality_inspection_count'), [1] * 100)
+        self.assertTrue(all(self.pickings.mapped('quality_inspection_approved')))
+
+    def test_rejected_inspection_flags_picking(self):
+        """La aprobación del picking sigue al calculado almacenado"""
+        picking = self.pickings[0]
+        inspection = self.env['stock.picking.quality.inspection'].create({
+            'picking_id': picking.id,
+            'findings': 'Empaque dañado',
+            'state': 'rejected',
+        })
+        self.assertFalse(picking.quality_inspection_approved)
+        self.assertTrue(picking.quality_inspection_rejected)
+
+        inspection.state = 'approved'
+        self.assertTrue(picking.quality_inspection_approved)
+        self.assertFalse(picking.quality_inspection_rejected)
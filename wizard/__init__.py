@@ -1 +1,3 @@
 from . import stock_picking_quality_wizard
+from . import mrp_bom_waste_update_wizard
+from . import product_lot_quality_import_wizard
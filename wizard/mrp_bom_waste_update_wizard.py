@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+
+class MrpBomWasteUpdateWizard(models.TransientModel):
+    """Wizard para Actualización Masiva del Porcentaje de Merma"""
+    _name = 'mrp.bom.waste.update.wizard'
+    _description = 'Wizard de Actualización Masiva de Merma'
+
+    selection_mode = fields.Selection([
+        ('category', 'Categoría de Producto'),
+        ('product', 'Producto'),
+        ('bom', 'Lista de Materiales')
+    ], string='Seleccionar por', required=True, default='bom')
+
+    categ_ids = fields.Many2many(
+        'product.category',
+        string='Categorías',
+        help='Se actualizarán las BOMs de los productos de estas categorías y sus subcategorías'
+    )
+
+    product_tmpl_ids = fields.Many2many(
+        'product.template',
+        string='Productos',
+        help='Se actualizarán las BOMs de estos productos'
+    )
+
+    bom_ids = fields.Many2many(
+        'mrp.bom',
+        string='Listas de Materiales',
+        default=lambda self: self._default_bom_ids()
+    )
+
+    waste_percentage = fields.Float(
+        string='Nuevo Porcentaje de Merma (%)',
+        required=True,
+        default=0.0
+    )
+
+    @api.model
+    def _default_bom_ids(self):
+        """Precarga las BOMs seleccionadas desde la vista de lista"""
+        if self.env.context.get('active_model') == 'mrp.bom':
+            return [(6, 0, self.env.context.get('active_ids', []))]
+        return False
+
+    def _get_boms_to_update(self):
+        """Devuelve las BOMs que corresponden a la selección del wizard"""
+        self.ensure_one()
+        if self.selection_mode == 'category':
+            domain = [('product_tmpl_id.categ_id', 'child_of', self.categ_ids.ids)]
+        elif self.selection_mode == 'product':
+            domain = [('product_tmpl_id', 'in', self.product_tmpl_ids.ids)]
+        else:
+            domain = [('id', 'in', self.bom_ids.ids)]
+        return self.env['mrp.bom'].search(domain)
+
+    def action_apply(self):
+        """Aplica el nuevo porcentaje a todas las BOMs y recalcula sus líneas con SQL"""
+        self.ensure_one()
+
+        if self.waste_percentage < 0:
+            raise UserError('El porcentaje de merma no puede ser negativo.')
+
+        boms = self._get_boms_to_update()
+        if not boms:
+            raise UserError('No se encontraron listas de materiales para la selección indicada.')
+
+        bom_count, line_count = boms._apply_waste_percentage(self.waste_percentage)
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Actualización de Merma',
+                'message': f'Se actualizaron {bom_count} listas de materiales y {line_count} líneas.',
+                'type': 'success',
+                'sticky': False,
+                'next': {'type': 'ir.actions.act_window_close'},
+            }
+        }
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import logging
+from datetime import date, datetime
+from itertools import islice
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import openpyxl
+except ImportError:
+    _logger.debug('openpyxl no disponible: no se podrán importar archivos XLSX')
+    openpyxl = None
+
+# Encabezados aceptados para cada columna del archivo del laboratorio
+IMPORT_COLUMNS = {
+    'lote': 'lot', 'lot': 'lot', 'numero de lote': 'lot', 'número de lote': 'lot',
+    'producto': 'product', 'product': 'product', 'referencia': 'product', 'referencia interna': 'product',
+    'fecha emision': 'issue_date', 'fecha emisión': 'issue_date', 'fecha de emision': 'issue_date',
+    'fecha de emisión': 'issue_date', 'fecha_emision': 'issue_date', 'issue_date': 'issue_date',
+    'fecha vencimiento': 'expiry_date', 'fecha de vencimiento': 'expiry_date',
+    'fecha_vencimiento': 'expiry_date', 'expiry_date': 'expiry_date',
+    'certificado': 'certificate_number', 'numero de certificado': 'certificate_number',
+    'número de certificado': 'certificate_number', 'numero_certificado': 'certificate_number',
+    'certificate_number': 'certificate_number',
+    'observaciones': 'notes', 'notas': 'notes', 'notes': 'notes',
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y')
+
+
+class ProductLotQualityImportWizard(models.TransientModel):
+    """Wizard para Importación Masiva de Certificados de Laboratorio"""
+    _name = 'product.lot.quality.import.wizard'
+    _description = 'Wizard de Importación de Certificados de Calidad'
+
+    file = fields.Binary(
+        string='Archivo',
+        required=True,
+        attachment=True,
+        help='Archivo CSV o XLSX con las columnas: Lote, Producto (referencia interna, opcional), '
+             'Fecha de Emisión, Fecha de Vencimiento (opcional), Número de Certificado y Observaciones'
+    )
+
+    filename = fields.Char(string='Nombre del Archivo')
+
+    chunk_size = fields.Integer(
+        string='Filas por Bloque',
+        default=1000,
+        required=True,
+        help='Cantidad de filas que se leen y guardan en cada bloque'
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Compañía',
+        default=lambda self: self.env.company,
+        required=True
+    )
+
+    state = fields.Selection([
+        ('draft', 'Borrador'),
+        ('done', 'Importado')
+    ], string='Estado', default='draft', readonly=True)
+
+    created_count = fields.Integer(string='Creados', readonly=True)
+
+    updated_count = fields.Integer(string='Actualizados', readonly=True)
+
+    error_count = fields.Integer(string='Filas con Error', readonly=True)
+
+    error_report = fields.Text(string='Errores por Fila', readonly=True)
+
+    def action_import(self):
+        """Importa el archivo por bloques y muestra el resultado con el detalle de errores"""
+        self.ensure_one()
+        if self.chunk_size <= 0:
+            raise UserError('La cantidad de filas por bloque debe ser mayor que cero.')
+
+        created = updated = 0
+        errors = []
+        with self._open_file() as stream:
+            rows = self._iter_rows(stream)
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                chunk_created, chunk_updated, chunk_errors = self._import_chunk(chunk)
+                created += chunk_created
+                updated += chunk_updated
+                errors += chunk_errors
+                # Liberar la caché del ORM para mantener la memoria estable
+                self.env.flush_all()
+                self.env.invalidate_all()
+
+        self.write({
+            'state': 'done',
+            'created_count': created,
+            'updated_count': updated,
+            'error_count': len(errors),
+            'error_report': '\n'.join(f'Fila {row_number}: {message}' for row_number, message in errors),
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Importar Certificados',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def _open_file(self):
+        """Abre el archivo adjunto como flujo, leyendo del filestore sin cargarlo en memoria"""
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_field', '=', 'file'),
+            ('res_id', '=', self.id),
+        ], limit=1)
+        if not attachment:
+            raise UserError('Debe adjuntar un archivo para importar.')
+        if attachment.store_fname:
+            return open(attachment._full_path(attachment.store_fname), 'rb')
+        return io.BytesIO(attachment.raw)
+
+    def _iter_rows(self, stream):
+        """Genera tuplas (número de fila, diccionario de valores) del archivo CSV o XLSX"""
+        if (self.filename or '').lower().endswith('.xlsx'):
+            if openpyxl is None:
+                raise UserError('Se requiere la librería openpyxl para importar archivos XLSX.')
+            workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+            raw_rows = workbook.active.iter_rows(values_only=True)
+        else:
+            text_stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+            sample = text_stream.read(4096)
+            text_stream.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+            except csv.Error:
+                dialect = csv.excel
+            raw_rows = csv.reader(text_stream, dialect)
+
+        header = next(raw_rows, None)
+        if not header:
+            raise UserError('El archivo está vacío.')
+        columns = [IMPORT_COLUMNS.get(str(name or '').strip().lower()) for name in header]
+        if 'lot' not in columns or 'issue_date' not in columns:
+            raise UserError('El archivo debe tener al menos las columnas "Lote" y "Fecha de Emisión".')
+
+        for row_number, row in enumerate(raw_rows, start=2):
+            if not any(value not in (None, '') for value in row):
+                continue
+            yield row_number, {
+                column: value for column, value in zip(columns, row) if column
+            }
+
+    def _import_chunk(self, chunk):
+        """
+        Crea o actualiza los certificados de un bloque de filas.
+
+        Los lotes del bloque se resuelven con una sola consulta y los certificados
+        existentes con otra; los nuevos se crean con un único ``create``.
+        Devuelve (creados, actualizados, [(fila, error)]).
+        """
+        errors = []
+        lots_by_name = self._get_lots_by_name({
+            str(values.get('lot') or '').strip() for _row_number, values in chunk
+        } - {''})
+
+        rows_by_lot = {}
+        for row_number, values in chunk:
+            try:
+                lot_id, product_id = self._resolve_lot(values, lots_by_name)
+                if lot_id in rows_by_lot:
+                    raise UserError(
+                        f'El lote {values.get("lot")} ya figura en la fila {rows_by_lot[lot_id][0]}; '
+                        'la fila duplicada no se importó.'
+                    )
+                rows_by_lot[lot_id] = (row_number, product_id, self._prepare_certificate_vals(values))
+            except UserError as error:
+                errors.append((row_number, str(error)))
+
+        Certificate = self.env['product.lot.quality'].with_context(defer_certificate_activities=True)
+        existing = {
+            certificate.lot_id.id: certificate
+            for certificate in Certificate.search([
+                ('lot_id', 'in', list(rows_by_lot)),
+                ('company_id', '=', self.company_id.id),
+            ])
+        }
+
+        updated = 0
+        to_create = []
+        for lot_id, (row_number, product_id, vals) in rows_by_lot.items():
+            certificate = existing.get(lot_id)
+            if not certificate:
+                to_create.append((row_number, dict(
+                    vals, lot_id=lot_id, product_id=product_id, company_id=self.company_id.id
+                )))
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    certificate.write(vals)
+                updated += 1
+            except Exception as error:
+                errors.append((row_number, str(error)))
+
+        created = 0
+        if to_create:
+            try:
+                with self.env.cr.savepoint():
+                    Certificate.create([vals for _row_number, vals in to_create])
+                created = len(to_create)
+            except Exception:
+                # Reintentar fila por fila para identificar las que fallan
+                for row_number, vals in to_create:
+                    try:
+                        with self.env.cr.savepoint():
+                            Certificate.create(vals)
+                        created += 1
+                    except Exception as error:
+                        errors.append((row_number, str(error)))
+
+        return created, updated, errors
+
+    def _get_lots_by_name(self, lot_names):
+        """Devuelve {nombre de lote: [(id de lote, id de producto, referencia interna)]} con una consulta"""
+        if not lot_names:
+            return {}
+        self.env['stock.lot'].flush_model(['name', 'product_id', 'company_id'])
+        self.env.cr.execute("""
+            SELECT lot.name, lot.id, lot.product_id, product.default_code
+              FROM stock_lot lot
+              JOIN product_product product ON product.id = lot.product_id
+             WHERE lot.name IN %s
+               AND (lot.company_id = %s OR lot.company_id IS NULL)
+        """, (tuple(lot_names), self.company_id.id))
+        lots_by_name = {}
+        for name, lot_id, product_id, default_code in self.env.cr.fetchall():
+            lots_by_name.setdefault(name, []).append((lot_id, product_id, default_code))
+        return lots_by_name
+
+    @api.model
+    def _resolve_lot(self, values, lots_by_name):
+        """Devuelve (id de lote, id de producto) de la fila, usando el producto para desambiguar"""
+        lot_name = str(values.get('lot') or '').strip()
+        if not lot_name:
+            raise UserError('Falta el número de lote.')
+        candidates = lots_by_name.get(lot_name, [])
+        product_code = str(values.get('product') or '').strip()
+        if product_code:
+            candidates = [lot for lot in candidates if lot[2] == product_code]
+        if not candidates:
+            raise UserError(f'No se encontró el lote {lot_name}' + (f' del producto {product_code}.' if product_code else '.'))
+        if len(candidates) > 1:
+            raise UserError(f'El lote {lot_name} existe para varios productos; indique la referencia del producto.')
+        lot_id, product_id, _default_code = candidates[0]
+        return lot_id, product_id
+
+    @api.model
+    def _prepare_certificate_vals(self, values):
+        """Convierte los valores de una fila en valores de ``product.lot.quality``"""
+        vals = {
+            'certificate_issue_date': self._parse_date(values.get('issue_date'), 'Fecha de Emisión'),
+            # El certificado del laboratorio confirma los borradores de renovación
+            'renewal_draft': False,
+        }
+        if values.get('expiry_date') not in (None, ''):
+            vals['certificate_expiry_date'] = self._parse_date(values['expiry_date'], 'Fecha de Vencimiento')
+        for column in ('certificate_number', 'notes'):
+            if values.get(column) not in (None, ''):
+                vals[column] = str(values[column]).strip()
+        return vals
+
+    @api.model
+    def _parse_date(self, value, label):
+        """Interpreta una fecha de CSV (texto) o de XLSX (fecha)"""
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        text = str(value or '').strip()
+        if not text:
+            raise UserError(f'Falta la {label}.')
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(text, date_format).date()
+            except ValueError:
+                continue
+        raise UserError(f'{label} inválida: {text}.')
@@ -53,3 +53,58 @@ class StockPickingQualityWizard(models.TransientModel):
                 'sticky': False,
             }
         }
+
+
+class StockPickingQualityMultiWizard(models.TransientModel):
+    """Wizard para Control de Calidad de Varias Recepciones"""
+    _name = 'stock.picking.quality.multi.wizard'
+    _description = 'Wizard de Control de Calidad de Varias Recepciones'
+
+    picking_ids = fields.Many2many(
+        'stock.picking',
+        string='Recepciones',
+        required=True,
+        domain="[('picking_type_code', '=', 'incoming')]"
+    )
+
+    findings = fields.Text(
+        string='Descripción del Control',
+        required=True,
+        help='Describa lo encontrado durante el control de calidad; se registra en cada recepción'
+    )
+
+    state = fields.Selection([
+        ('approved', 'Aprobado'),
+        ('rejected', 'Desaprobado')
+    ], string='Resultado', required=True, default='approved')
+
+    def action_confirm(self):
+        """Guarda un control de calidad por recepción con un único create"""
+        self.ensure_one()
+
+        receptions = self.picking_ids.filtered(lambda p: p.picking_type_code == 'incoming')
+        if not receptions:
+            raise UserError('Debe seleccionar al menos una recepción.')
+
+        self.env['stock.picking.quality.inspection'].create([{
+            'picking_id': picking.id,
+            'findings': self.findings,
+            'state': self.state,
+        } for picking in receptions])
+
+        if self.state == 'approved':
+            message = f'Control de calidad aprobado para {len(receptions)} recepciones.'
+        else:
+            message = f'Control de calidad desaprobado para {len(receptions)} recepciones.'
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Control de Calidad',
+                'message': message,
+                'type': 'success' if self.state == 'approved' else 'warning',
+                'sticky': False,
+                'next': {'type': 'ir.actions.act_window_close'},
+            }
+        }